@@ -0,0 +1,44 @@
+// Time-lapse playback. The server streams chunks of frames into the
+// 'animation-chunk' store; here they are gathered in 'animation-frames' and
+// drawn one per tick of the 'animation-clock' interval by swapping the values
+// of the choropleth, which keeps the geometries already on the map
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    animation: {
+        append_chunk: function (chunk, frames) {
+            if (!chunk) {
+                return null;
+            }
+            // A new time-lapse starts from its first chunk
+            if (chunk.offset === 0 || !frames) {
+                return { dates: chunk.dates, z: chunk.z, total: chunk.total };
+            }
+            return {
+                dates: frames.dates.concat(chunk.dates),
+                z: frames.z.concat(chunk.z),
+                total: chunk.total,
+            };
+        },
+
+        show_frame: function (n_intervals, frames, figure) {
+            const no_update = window.dash_clientside.no_update;
+            if (!frames || !figure || n_intervals >= frames.total) {
+                // Stop the clock at the end of the time-lapse
+                return [no_update, no_update, true];
+            }
+            if (n_intervals >= frames.z.length) {
+                // The chunk with this frame has not arrived yet: keep the last
+                // one on display and skip ahead once it does
+                return [no_update, no_update, false];
+            }
+
+            const trace = Object.assign({}, figure.data[0], {
+                z: frames.z[n_intervals],
+            });
+            return [
+                Object.assign({}, figure, { data: [trace] }),
+                frames.dates[n_intervals],
+                false,
+            ];
+        },
+    },
+});
@@ -0,0 +1,11 @@
+-- Compress the chunks past the threshold now, and newer ones as they age
+SELECT add_compression_policy(
+        'era5_measurements',
+        compress_after => CAST(:compress_after AS INTERVAL),
+        if_not_exists => TRUE
+    );
+SELECT compress_chunk(c, if_not_compressed => TRUE)
+FROM show_chunks(
+        'era5_measurements',
+        older_than => CAST(:compress_after AS INTERVAL)
+    ) c;
\ No newline at end of file
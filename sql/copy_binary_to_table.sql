@@ -0,0 +1,2 @@
+COPY {table} ({columns})
+FROM STDIN WITH (FORMAT binary);
\ No newline at end of file
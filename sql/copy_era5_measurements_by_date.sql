@@ -0,0 +1,27 @@
+INSERT INTO era5_measurements(
+        measurement_id,
+        town_id,
+        time_id,
+        date,
+        t2m,
+        tp,
+        t2m_min,
+        t2m_max,
+        max_nocturnal_temp,
+        min_diurnal_temp,
+        diurnal_temp_variation
+    )
+SELECT m.measurement_id,
+    m.town_id,
+    m.time_id,
+    ti.date,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_measurements_by_time_id m
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE m.time_id BETWEEN :start_time_id AND :end_time_id;
\ No newline at end of file
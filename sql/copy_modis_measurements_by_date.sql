@@ -0,0 +1,15 @@
+INSERT INTO modis_measurements(
+        measurement_id,
+        town_id,
+        time_id,
+        date,
+        ndvi
+    )
+SELECT m.measurement_id,
+    m.town_id,
+    m.time_id,
+    ti.date,
+    m.ndvi
+FROM modis_measurements_by_time_id m
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE m.time_id BETWEEN :start_time_id AND :end_time_id;
\ No newline at end of file
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS areas (
+    area_id SERIAL PRIMARY KEY,
+    level VARCHAR(20) NOT NULL,
+    area_name VARCHAR(100) NOT NULL,
+    geometry GEOMETRY(MultiPolygon, 4326) NOT NULL,
+    UNIQUE (level, area_name)
+);
+CREATE TABLE IF NOT EXISTS area_towns (
+    area_id INT REFERENCES areas(area_id),
+    town_id INT REFERENCES towns(town_id),
+    weight FLOAT NOT NULL,
+    PRIMARY KEY (area_id, town_id)
+);
\ No newline at end of file
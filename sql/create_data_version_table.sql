@@ -0,0 +1,4 @@
+CREATE TABLE IF NOT EXISTS data_version (
+    version SERIAL PRIMARY KEY,
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
\ No newline at end of file
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_date_town_modis ON modis_measurements(date, town_id);
\ No newline at end of file
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS era5_area_measurements (
+    area_id INT REFERENCES areas(area_id),
+    time_id INT REFERENCES time(time_id),
+    t2m FLOAT,
+    tp FLOAT,
+    t2m_min FLOAT,
+    t2m_max FLOAT,
+    max_nocturnal_temp FLOAT,
+    min_diurnal_temp FLOAT,
+    diurnal_temp_variation FLOAT,
+    PRIMARY KEY (area_id, time_id)
+);
+CREATE INDEX IF NOT EXISTS idx_time_area_era5 ON era5_area_measurements(time_id);
\ No newline at end of file
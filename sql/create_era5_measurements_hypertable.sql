@@ -1,5 +1,14 @@
+-- Partition on the date itself, so a per-date query is pruned to one chunk
+-- at plan time. Chunks span a year, around three million rows each, so the
+-- series of a town only opens one chunk per year of the record
+-- No default index on date: create_index builds (date, town_id) once the
+-- measurements are loaded
 SELECT create_hypertable(
         'era5_measurements',
-        'time_id',
+        'date',
+        chunk_time_interval => INTERVAL '1 year',
+        create_default_indexes => FALSE,
         if_not_exists => TRUE
-    );
\ No newline at end of file
+    );
+-- Hypertables created with monthly chunks get yearly ones from now on
+SELECT set_chunk_time_interval('era5_measurements', INTERVAL '1 year');
\ No newline at end of file
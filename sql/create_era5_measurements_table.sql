@@ -1,7 +1,9 @@
+-- Deferrable, so bulk loads check the keys once at commit
 CREATE TABLE IF NOT EXISTS era5_measurements (
     measurement_id SERIAL,
-    town_id INT REFERENCES towns(town_id),
-    time_id INT REFERENCES time(time_id),
+    town_id INT REFERENCES towns(town_id) DEFERRABLE,
+    time_id INT REFERENCES time(time_id) DEFERRABLE,
+    date DATE NOT NULL,
     t2m FLOAT,
     tp FLOAT,
     t2m_min FLOAT,
@@ -0,0 +1,18 @@
+-- A plain table refreshed by ingestion rather than a continuous aggregate.
+-- Continuous aggregates group by a single time_bucket of the hypertable's
+-- date, and TimescaleDB 2.14 cannot bucket months from an origin, which the
+-- seasons starting on 1 December need
+CREATE TABLE IF NOT EXISTS era5_period_measurements (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    town_id INT REFERENCES towns(town_id),
+    t2m FLOAT,
+    tp FLOAT,
+    t2m_min FLOAT,
+    t2m_max FLOAT,
+    max_nocturnal_temp FLOAT,
+    min_diurnal_temp FLOAT,
+    diurnal_temp_variation FLOAT,
+    n_days INT,
+    PRIMARY KEY (resolution, period_start, town_id)
+);
\ No newline at end of file
@@ -0,0 +1,12 @@
+-- Source files loaded by the ingestion scripts and their checksums, so a
+-- rerun skips the files already loaded and replaces the ones that changed
+CREATE TABLE IF NOT EXISTS ingestion_manifest (
+    source VARCHAR(10) NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    checksum CHAR(64) NOT NULL,
+    row_count INT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (source, file_name)
+);
\ No newline at end of file
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS modis_area_measurements (
+    area_id INT REFERENCES areas(area_id),
+    time_id INT REFERENCES time(time_id),
+    ndvi FLOAT,
+    PRIMARY KEY (area_id, time_id)
+);
+CREATE INDEX IF NOT EXISTS idx_time_area_modis ON modis_area_measurements(time_id);
\ No newline at end of file
@@ -1,5 +1,11 @@
+-- Partition on the date itself, so a per-date query is pruned to one chunk
+-- at plan time. Composites are 16 days apart, so chunks span a year
+-- No default index on date: create_index builds (date, town_id) once the
+-- measurements are loaded
 SELECT create_hypertable(
         'modis_measurements',
-        'time_id',
+        'date',
+        chunk_time_interval => INTERVAL '1 year',
+        create_default_indexes => FALSE,
         if_not_exists => TRUE
     );
\ No newline at end of file
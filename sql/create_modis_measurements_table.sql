@@ -1,6 +1,8 @@
+-- Deferrable, so bulk loads check the keys once at commit
 CREATE TABLE IF NOT EXISTS modis_measurements (
     measurement_id SERIAL,
-    town_id INT REFERENCES towns(town_id),
-    time_id INT REFERENCES time(time_id),
+    town_id INT REFERENCES towns(town_id) DEFERRABLE,
+    time_id INT REFERENCES time(time_id) DEFERRABLE,
+    date DATE NOT NULL,
     ndvi FLOAT
 );
\ No newline at end of file
@@ -0,0 +1,9 @@
+-- Refreshed by ingestion, like era5_period_measurements
+CREATE TABLE IF NOT EXISTS modis_period_measurements (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    town_id INT REFERENCES towns(town_id),
+    ndvi FLOAT,
+    n_days INT,
+    PRIMARY KEY (resolution, period_start, town_id)
+);
\ No newline at end of file
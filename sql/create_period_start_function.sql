@@ -0,0 +1,11 @@
+-- First day of the month, season or year a date falls in. Seasons are
+-- meteorological (DJF, MAM, JJA, SON), so winter starts on 1 December
+CREATE OR REPLACE FUNCTION period_start(resolution TEXT, d DATE) RETURNS DATE LANGUAGE SQL IMMUTABLE AS $$
+SELECT CASE
+        resolution
+        WHEN 'month' THEN date_trunc('month', d)::DATE
+        WHEN 'season' THEN (
+            date_trunc('quarter', d + INTERVAL '1 month') - INTERVAL '1 month'
+        )::DATE
+        WHEN 'year' THEN date_trunc('year', d)::DATE
+    END $$;
\ No newline at end of file
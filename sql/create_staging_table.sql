@@ -0,0 +1,5 @@
+-- Temporary copy of the columns of a table, filled by COPY and moved into the
+-- table at once. Identifiers are composed with psycopg2.sql
+CREATE TEMP TABLE {staging} AS
+SELECT {columns}
+FROM {table} WITH NO DATA;
\ No newline at end of file
@@ -1 +0,0 @@
-CREATE INDEX idx_town_id_era5 ON era5_measurements(town_id);
\ No newline at end of file
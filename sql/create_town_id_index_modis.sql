@@ -1 +0,0 @@
-CREATE INDEX idx_town_id_modis ON modis_measurements(town_id);
\ No newline at end of file
@@ -0,0 +1,13 @@
+DROP INDEX IF EXISTS idx_town_id_era5;
+DROP INDEX IF EXISTS idx_town_time_era5;
+DROP INDEX IF EXISTS idx_town_date_era5;
+-- Unique, so a file loaded twice cannot duplicate a town and date
+CREATE UNIQUE INDEX IF NOT EXISTS idx_town_date_unique_era5 ON era5_measurements(town_id, date) INCLUDE (
+    t2m,
+    tp,
+    t2m_min,
+    t2m_max,
+    max_nocturnal_temp,
+    min_diurnal_temp,
+    diurnal_temp_variation
+);
\ No newline at end of file
@@ -0,0 +1,5 @@
+DROP INDEX IF EXISTS idx_town_id_modis;
+DROP INDEX IF EXISTS idx_town_time_modis;
+DROP INDEX IF EXISTS idx_town_date_modis;
+-- Unique, so a file loaded twice cannot duplicate a town and date
+CREATE UNIQUE INDEX IF NOT EXISTS idx_town_date_unique_modis ON modis_measurements(town_id, date) INCLUDE (ndvi);
\ No newline at end of file
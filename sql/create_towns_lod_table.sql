@@ -0,0 +1,6 @@
+CREATE TABLE IF NOT EXISTS towns_lod (
+    town_id INT REFERENCES towns(town_id),
+    tolerance FLOAT NOT NULL,
+    geometry GEOMETRY(MultiPolygon, 4326) NOT NULL,
+    PRIMARY KEY (town_id, tolerance)
+);
\ No newline at end of file
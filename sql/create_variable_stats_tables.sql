@@ -0,0 +1,28 @@
+CREATE TABLE IF NOT EXISTS variable_stats (
+    variable VARCHAR(50) NOT NULL,
+    time_id INT REFERENCES time(time_id),
+    p02 FLOAT,
+    p98 FLOAT,
+    min_value FLOAT,
+    max_value FLOAT,
+    n_values INT,
+    PRIMARY KEY (variable, time_id)
+);
+CREATE TABLE IF NOT EXISTS variable_climatology (
+    variable VARCHAR(50) PRIMARY KEY,
+    p02 FLOAT,
+    p98 FLOAT,
+    min_value FLOAT,
+    max_value FLOAT,
+    n_values BIGINT
+);
+CREATE TABLE IF NOT EXISTS period_climatology (
+    variable VARCHAR(50) NOT NULL,
+    resolution VARCHAR(10) NOT NULL,
+    p02 FLOAT,
+    p98 FLOAT,
+    min_value FLOAT,
+    max_value FLOAT,
+    n_values BIGINT,
+    PRIMARY KEY (variable, resolution)
+);
\ No newline at end of file
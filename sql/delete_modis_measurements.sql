@@ -0,0 +1,3 @@
+-- Remove the measurements of the dates of a file before it is loaded again
+DELETE FROM modis_measurements
+WHERE date BETWEEN :start_date AND :end_date;
\ No newline at end of file
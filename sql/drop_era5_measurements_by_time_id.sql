@@ -0,0 +1,7 @@
+-- Carry on numbering the measurements where the old table left off
+SELECT setval(
+        pg_get_serial_sequence('era5_measurements', 'measurement_id'),
+        COALESCE(MAX(measurement_id), 1)
+    )
+FROM era5_measurements;
+DROP TABLE era5_measurements_by_time_id;
\ No newline at end of file
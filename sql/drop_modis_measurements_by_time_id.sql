@@ -0,0 +1,7 @@
+-- Carry on numbering the measurements where the old table left off
+SELECT setval(
+        pg_get_serial_sequence('modis_measurements', 'measurement_id'),
+        COALESCE(MAX(measurement_id), 1)
+    )
+FROM modis_measurements;
+DROP TABLE modis_measurements_by_time_id;
\ No newline at end of file
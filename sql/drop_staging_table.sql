@@ -0,0 +1 @@
+DROP TABLE {staging};
\ No newline at end of file
@@ -0,0 +1,7 @@
+SELECT area_id,
+    area_name,
+    geometry
+FROM areas_lod
+WHERE level = :level
+    AND tolerance = :tolerance
+ORDER BY area_id;
\ No newline at end of file
@@ -0,0 +1,15 @@
+-- Store compressed chunks as one batch of dates per town. Compression settings
+-- cannot change once chunks are compressed, so they are only set once
+DO $$ BEGIN IF NOT EXISTS (
+    SELECT 1
+    FROM timescaledb_information.compression_settings
+    WHERE hypertable_name = 'era5_measurements'
+) THEN
+ALTER TABLE era5_measurements
+SET (
+        timescaledb.compress,
+        timescaledb.compress_segmentby = 'town_id',
+        timescaledb.compress_orderby = 'date'
+    );
+END IF;
+END $$;
\ No newline at end of file
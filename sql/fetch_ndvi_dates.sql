@@ -1,4 +1,3 @@
-SELECT DISTINCT ti.date
+SELECT DISTINCT mm.date
 FROM modis_measurements mm
-    JOIN time ti ON mm.time_id = ti.time_id
-ORDER BY ti.date ASC;
\ No newline at end of file
+ORDER BY mm.date ASC;
\ No newline at end of file
@@ -0,0 +1,3 @@
+INSERT INTO {table} ({columns})
+SELECT {columns}
+FROM {staging};
\ No newline at end of file
@@ -0,0 +1,13 @@
+-- Weight each town by its surface in m², so area aggregates are area-weighted
+-- means of their towns
+INSERT INTO area_towns (area_id, town_id, weight)
+SELECT a.area_id,
+    t.town_id,
+    ST_Area(t.geometry::geography)
+FROM towns t
+    JOIN areas a ON a.area_name = CASE
+        WHEN a.level = 'province' THEN t.province
+        ELSE t.region
+    END ON CONFLICT (area_id, town_id) DO
+UPDATE
+SET weight = EXCLUDED.weight;
\ No newline at end of file
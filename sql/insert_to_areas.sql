@@ -0,0 +1,17 @@
+-- Dissolve the towns of each province or region into a single geometry
+INSERT INTO areas (level, area_name, geometry)
+SELECT :level,
+    t.area_name,
+    ST_Multi(ST_CollectionExtract(ST_Union(t.geometry), 3))
+FROM (
+        SELECT CASE
+                WHEN :level = 'province' THEN province
+                ELSE region
+            END AS area_name,
+            geometry
+        FROM towns
+    ) t
+WHERE t.area_name IS NOT NULL
+GROUP BY t.area_name ON CONFLICT (level, area_name) DO
+UPDATE
+SET geometry = EXCLUDED.geometry;
\ No newline at end of file
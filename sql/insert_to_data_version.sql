@@ -0,0 +1 @@
+INSERT INTO data_version DEFAULT VALUES;
\ No newline at end of file
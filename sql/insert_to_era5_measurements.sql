@@ -1,22 +0,0 @@
-INSERT INTO era5_measurements(
-        town_id,
-        time_id,
-        t2m,
-        tp,
-        t2m_min,
-        t2m_max,
-        max_nocturnal_temp,
-        min_diurnal_temp,
-        diurnal_temp_variation
-    )
-VALUES (
-        :town_id,
-        :time_id,
-        :t2m,
-        :tp,
-        :t2m_min,
-        :t2m_max,
-        :max_nocturnal_temp,
-        :min_diurnal_temp,
-        :diurnal_temp_variation
-    );
\ No newline at end of file
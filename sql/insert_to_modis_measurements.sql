@@ -1,10 +0,0 @@
-INSERT INTO modis_measurements(
-        town_id,
-        time_id,
-        ndvi
-    )
-VALUES (
-        :town_id,
-        :time_id,
-        :ndvi
-    );
\ No newline at end of file
@@ -1,2 +0,0 @@
-INSERT INTO time(date)
-VALUES (:date);
\ No newline at end of file
@@ -1,7 +0,0 @@
-INSERT INTO towns (town_name, province, region, geometry)
-VALUES (
-        :town_name,
-        :province,
-        :region,
-        ST_GeomFromText(:geometry, 4326)
-    );
\ No newline at end of file
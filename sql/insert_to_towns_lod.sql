@@ -0,0 +1,8 @@
+INSERT INTO towns_lod (town_id, tolerance, geometry)
+SELECT town_id,
+    :tolerance,
+    -- Keep towns smaller than the tolerance instead of dropping them
+    ST_Multi(ST_Simplify(geometry, :tolerance, TRUE))
+FROM towns ON CONFLICT (town_id, tolerance) DO
+UPDATE
+SET geometry = EXCLUDED.geometry;
\ No newline at end of file
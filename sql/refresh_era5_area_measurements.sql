@@ -0,0 +1,37 @@
+-- Recompute the province and region aggregates of the dates of a file
+DELETE FROM era5_area_measurements am USING time ti
+WHERE am.time_id = ti.time_id
+    AND ti.date BETWEEN :start_date AND :end_date;
+INSERT INTO era5_area_measurements (
+        area_id,
+        time_id,
+        t2m,
+        tp,
+        t2m_min,
+        t2m_max,
+        max_nocturnal_temp,
+        min_diurnal_temp,
+        diurnal_temp_variation
+    )
+SELECT w.area_id,
+    m.time_id,
+    -- Area-weighted means over the towns with a value
+    SUM(m.t2m * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m IS NOT NULL), 0),
+    SUM(m.tp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.tp IS NOT NULL), 0),
+    SUM(m.t2m_min * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m_min IS NOT NULL), 0),
+    SUM(m.t2m_max * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m_max IS NOT NULL), 0),
+    SUM(m.max_nocturnal_temp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.max_nocturnal_temp IS NOT NULL), 0),
+    SUM(m.min_diurnal_temp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.min_diurnal_temp IS NOT NULL), 0),
+    SUM(m.diurnal_temp_variation * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.diurnal_temp_variation IS NOT NULL), 0)
+FROM era5_measurements m
+    JOIN area_towns w ON m.town_id = w.town_id
+WHERE m.date BETWEEN :start_date AND :end_date
+GROUP BY w.area_id,
+    m.time_id;
\ No newline at end of file
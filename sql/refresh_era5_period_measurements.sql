@@ -0,0 +1,46 @@
+-- Recompute the monthly, seasonal and annual values of every period that
+-- overlaps the dates of a file, from all the days of those periods.
+-- Precipitation is summed over the period and the other variables averaged
+INSERT INTO era5_period_measurements (
+        resolution,
+        period_start,
+        town_id,
+        t2m,
+        tp,
+        t2m_min,
+        t2m_max,
+        max_nocturnal_temp,
+        min_diurnal_temp,
+        diurnal_temp_variation,
+        n_days
+    )
+SELECT r.resolution,
+    period_start(r.resolution, m.date),
+    m.town_id,
+    AVG(m.t2m),
+    SUM(m.tp),
+    AVG(m.t2m_min),
+    AVG(m.t2m_max),
+    AVG(m.max_nocturnal_temp),
+    AVG(m.min_diurnal_temp),
+    AVG(m.diurnal_temp_variation),
+    COUNT(*)
+FROM (
+        VALUES ('month', INTERVAL '1 month'),
+            ('season', INTERVAL '3 months'),
+            ('year', INTERVAL '1 year')
+    ) AS r(resolution, step)
+    JOIN era5_measurements m ON m.date >= period_start(r.resolution, :start_date)
+    AND m.date < period_start(r.resolution, :end_date) + r.step
+GROUP BY r.resolution,
+    period_start(r.resolution, m.date),
+    m.town_id ON CONFLICT (resolution, period_start, town_id) DO
+UPDATE
+SET t2m = EXCLUDED.t2m,
+    tp = EXCLUDED.tp,
+    t2m_min = EXCLUDED.t2m_min,
+    t2m_max = EXCLUDED.t2m_max,
+    max_nocturnal_temp = EXCLUDED.max_nocturnal_temp,
+    min_diurnal_temp = EXCLUDED.min_diurnal_temp,
+    diurnal_temp_variation = EXCLUDED.diurnal_temp_variation,
+    n_days = EXCLUDED.n_days;
\ No newline at end of file
@@ -0,0 +1,48 @@
+-- Recompute the town value statistics of every variable for the dates of a file
+DELETE FROM variable_stats vs USING time ti
+WHERE vs.time_id = ti.time_id
+    AND vs.variable IN (
+        't2m',
+        'tp',
+        't2m_min',
+        't2m_max',
+        'max_nocturnal_temp',
+        'min_diurnal_temp',
+        'diurnal_temp_variation'
+    )
+    AND ti.date BETWEEN :start_date AND :end_date;
+INSERT INTO variable_stats (
+        variable,
+        time_id,
+        p02,
+        p98,
+        min_value,
+        max_value,
+        n_values
+    )
+SELECT v.variable,
+    m.time_id,
+    percentile_cont(0.02) WITHIN GROUP (
+        ORDER BY v.value
+    ),
+    percentile_cont(0.98) WITHIN GROUP (
+        ORDER BY v.value
+    ),
+    MIN(v.value),
+    MAX(v.value),
+    COUNT(v.value)
+FROM era5_measurements m
+    -- One row per variable and town
+    CROSS JOIN LATERAL (
+        VALUES ('t2m', m.t2m),
+            ('tp', m.tp),
+            ('t2m_min', m.t2m_min),
+            ('t2m_max', m.t2m_max),
+            ('max_nocturnal_temp', m.max_nocturnal_temp),
+            ('min_diurnal_temp', m.min_diurnal_temp),
+            ('diurnal_temp_variation', m.diurnal_temp_variation)
+    ) AS v(variable, value)
+WHERE m.date BETWEEN :start_date AND :end_date
+    AND v.value IS NOT NULL
+GROUP BY v.variable,
+    m.time_id;
\ No newline at end of file
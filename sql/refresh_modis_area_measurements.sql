@@ -0,0 +1,15 @@
+-- Recompute the province and region aggregates of the dates of a file
+DELETE FROM modis_area_measurements am USING time ti
+WHERE am.time_id = ti.time_id
+    AND ti.date BETWEEN :start_date AND :end_date;
+INSERT INTO modis_area_measurements (area_id, time_id, ndvi)
+SELECT w.area_id,
+    m.time_id,
+    -- Area-weighted mean over the towns with a value
+    SUM(m.ndvi * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.ndvi IS NOT NULL), 0)
+FROM modis_measurements m
+    JOIN area_towns w ON m.town_id = w.town_id
+WHERE m.date BETWEEN :start_date AND :end_date
+GROUP BY w.area_id,
+    m.time_id;
\ No newline at end of file
@@ -0,0 +1,27 @@
+-- Recompute the monthly, seasonal and annual NDVI of every period that
+-- overlaps the dates of a file, as the mean of the composites in the period
+INSERT INTO modis_period_measurements (
+        resolution,
+        period_start,
+        town_id,
+        ndvi,
+        n_days
+    )
+SELECT r.resolution,
+    period_start(r.resolution, m.date),
+    m.town_id,
+    AVG(m.ndvi),
+    COUNT(*)
+FROM (
+        VALUES ('month', INTERVAL '1 month'),
+            ('season', INTERVAL '3 months'),
+            ('year', INTERVAL '1 year')
+    ) AS r(resolution, step)
+    JOIN modis_measurements m ON m.date >= period_start(r.resolution, :start_date)
+    AND m.date < period_start(r.resolution, :end_date) + r.step
+GROUP BY r.resolution,
+    period_start(r.resolution, m.date),
+    m.town_id ON CONFLICT (resolution, period_start, town_id) DO
+UPDATE
+SET ndvi = EXCLUDED.ndvi,
+    n_days = EXCLUDED.n_days;
\ No newline at end of file
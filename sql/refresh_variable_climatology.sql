@@ -0,0 +1,94 @@
+-- Typical range of each variable: the median over every date of its daily
+-- 2nd and 98th percentiles, plus the extremes of the whole record
+DELETE FROM variable_climatology;
+INSERT INTO variable_climatology (
+        variable,
+        p02,
+        p98,
+        min_value,
+        max_value,
+        n_values
+    )
+SELECT variable,
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY p02
+    ),
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY p98
+    ),
+    MIN(min_value),
+    MAX(max_value),
+    SUM(n_values)
+FROM variable_stats
+GROUP BY variable;
+-- Typical range of each variable on monthly, seasonal and annual maps: the
+-- median over every period of the 2nd and 98th percentiles of its town values
+DELETE FROM period_climatology;
+INSERT INTO period_climatology (
+        variable,
+        resolution,
+        p02,
+        p98,
+        min_value,
+        max_value,
+        n_values
+    )
+SELECT variable,
+    resolution,
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY p02
+    ),
+    percentile_cont(0.5) WITHIN GROUP (
+        ORDER BY p98
+    ),
+    MIN(min_value),
+    MAX(max_value),
+    SUM(n_values)
+FROM (
+        SELECT v.variable,
+            m.resolution,
+            m.period_start,
+            percentile_cont(0.02) WITHIN GROUP (
+                ORDER BY v.value
+            ) AS p02,
+            percentile_cont(0.98) WITHIN GROUP (
+                ORDER BY v.value
+            ) AS p98,
+            MIN(v.value) AS min_value,
+            MAX(v.value) AS max_value,
+            COUNT(v.value) AS n_values
+        FROM era5_period_measurements m
+            -- One row per variable and town
+            CROSS JOIN LATERAL (
+                VALUES ('t2m', m.t2m),
+                    ('tp', m.tp),
+                    ('t2m_min', m.t2m_min),
+                    ('t2m_max', m.t2m_max),
+                    ('max_nocturnal_temp', m.max_nocturnal_temp),
+                    ('min_diurnal_temp', m.min_diurnal_temp),
+                    ('diurnal_temp_variation', m.diurnal_temp_variation)
+            ) AS v(variable, value)
+        WHERE v.value IS NOT NULL
+        GROUP BY v.variable,
+            m.resolution,
+            m.period_start
+        UNION ALL
+        SELECT 'ndvi',
+            m.resolution,
+            m.period_start,
+            percentile_cont(0.02) WITHIN GROUP (
+                ORDER BY m.ndvi
+            ),
+            percentile_cont(0.98) WITHIN GROUP (
+                ORDER BY m.ndvi
+            ),
+            MIN(m.ndvi),
+            MAX(m.ndvi),
+            COUNT(m.ndvi)
+        FROM modis_period_measurements m
+        WHERE m.ndvi IS NOT NULL
+        GROUP BY m.resolution,
+            m.period_start
+    ) AS s
+GROUP BY variable,
+    resolution;
\ No newline at end of file
@@ -0,0 +1,6 @@
+-- Set the rows partitioned on time_id aside while the table is rebuilt on
+-- the date column. Its indexes go too, so the new table can take their names
+DROP INDEX IF EXISTS idx_town_id_modis;
+DROP INDEX IF EXISTS idx_town_time_modis;
+ALTER TABLE modis_measurements
+    RENAME TO modis_measurements_by_time_id;
\ No newline at end of file
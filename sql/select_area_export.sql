@@ -0,0 +1,46 @@
+-- Both sources of each area and date on one row, with the columns of a source
+-- left null on dates it has no values for
+WITH e AS (
+    SELECT m.time_id,
+        m.area_id,
+        m.t2m,
+        m.tp,
+        m.t2m_min,
+        m.t2m_max,
+        m.max_nocturnal_temp,
+        m.min_diurnal_temp,
+        m.diurnal_temp_variation
+    FROM era5_area_measurements m
+        JOIN time ti ON m.time_id = ti.time_id
+    WHERE ti.date BETWEEN :start_date AND :end_date
+),
+n AS (
+    SELECT m.time_id,
+        m.area_id,
+        m.ndvi
+    FROM modis_area_measurements m
+        JOIN time ti ON m.time_id = ti.time_id
+    WHERE ti.date BETWEEN :start_date AND :end_date
+)
+SELECT ti.date,
+    area_id,
+    a.area_name,
+    e.t2m,
+    e.tp,
+    e.t2m_min,
+    e.t2m_max,
+    e.max_nocturnal_temp,
+    e.min_diurnal_temp,
+    e.diurnal_temp_variation,
+    n.ndvi
+FROM e
+    FULL JOIN n USING (time_id, area_id)
+    JOIN areas a USING (area_id)
+    JOIN time ti USING (time_id)
+WHERE a.level = :level
+    AND (
+        CAST(:ids AS INT []) IS NULL
+        OR area_id = ANY(CAST(:ids AS INT []))
+    )
+ORDER BY time_id,
+    area_id;
\ No newline at end of file
@@ -0,0 +1,6 @@
+SELECT area_id,
+    area_name,
+    ST_Multi(ST_Simplify(geometry, :tolerance, TRUE)) AS geometry
+FROM areas
+WHERE level = :level
+ORDER BY area_id;
\ No newline at end of file
@@ -0,0 +1,2 @@
+SELECT COALESCE(MAX(version), 0) AS version
+FROM data_version;
\ No newline at end of file
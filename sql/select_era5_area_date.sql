@@ -0,0 +1,13 @@
+SELECT m.area_id,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_area_measurements m
+    JOIN areas a ON m.area_id = a.area_id
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE a.level = :level
+    AND ti.date = :date;
\ No newline at end of file
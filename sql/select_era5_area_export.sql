@@ -0,0 +1,21 @@
+SELECT ti.date,
+    m.area_id,
+    a.area_name,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_area_measurements m
+    JOIN areas a ON m.area_id = a.area_id
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE a.level = :level
+    AND ti.date BETWEEN :start_date AND :end_date
+    AND (
+        CAST(:ids AS INT []) IS NULL
+        OR m.area_id = ANY(CAST(:ids AS INT []))
+    )
+ORDER BY m.time_id,
+    m.area_id;
\ No newline at end of file
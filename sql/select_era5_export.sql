@@ -0,0 +1,27 @@
+SELECT m.date,
+    m.town_id,
+    t.town_name,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_measurements m
+    JOIN towns t ON m.town_id = t.town_id
+WHERE m.date BETWEEN :start_date AND :end_date
+    AND (
+        CAST(:ids AS INT []) IS NULL
+        OR m.town_id = ANY(CAST(:ids AS INT []))
+    )
+    AND (
+        CAST(:areas AS INT []) IS NULL
+        OR m.town_id IN (
+            SELECT w.town_id
+            FROM area_towns w
+            WHERE w.area_id = ANY(CAST(:areas AS INT []))
+        )
+    )
+ORDER BY m.date,
+    m.town_id;
\ No newline at end of file
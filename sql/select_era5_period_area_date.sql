@@ -0,0 +1,23 @@
+-- Area-weighted means of the town values of a period
+SELECT w.area_id,
+    SUM(m.t2m * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m IS NOT NULL), 0) AS t2m,
+    SUM(m.tp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.tp IS NOT NULL), 0) AS tp,
+    SUM(m.t2m_min * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m_min IS NOT NULL), 0) AS t2m_min,
+    SUM(m.t2m_max * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.t2m_max IS NOT NULL), 0) AS t2m_max,
+    SUM(m.max_nocturnal_temp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.max_nocturnal_temp IS NOT NULL), 0) AS max_nocturnal_temp,
+    SUM(m.min_diurnal_temp * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.min_diurnal_temp IS NOT NULL), 0) AS min_diurnal_temp,
+    SUM(m.diurnal_temp_variation * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.diurnal_temp_variation IS NOT NULL), 0) AS diurnal_temp_variation
+FROM era5_period_measurements m
+    JOIN area_towns w ON m.town_id = w.town_id
+    JOIN areas a ON w.area_id = a.area_id
+WHERE a.level = :level
+    AND m.resolution = :resolution
+    AND m.period_start = :date
+GROUP BY w.area_id;
\ No newline at end of file
@@ -0,0 +1,13 @@
+SELECT m.date,
+    m.town_id,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_measurements m
+WHERE m.date BETWEEN :start_date AND :end_date
+ORDER BY m.date,
+    m.town_id;
\ No newline at end of file
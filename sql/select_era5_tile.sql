@@ -0,0 +1,25 @@
+WITH bounds AS (
+    SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+),
+tile_towns AS (
+    SELECT t.town_id,
+        t.town_name,
+        m.t2m,
+        m.tp,
+        m.t2m_min,
+        m.t2m_max,
+        m.max_nocturnal_temp,
+        m.min_diurnal_temp,
+        m.diurnal_temp_variation,
+        ST_AsMVTGeom(
+            ST_Transform(ST_Simplify(t.geometry, :tolerance), 3857),
+            bounds.geom
+        ) AS geom
+    FROM towns t
+        JOIN bounds ON t.geometry && ST_Transform(bounds.geom, 4326)
+        JOIN era5_measurements m ON t.town_id = m.town_id
+    WHERE m.date = :date
+)
+SELECT ST_AsMVT(tile_towns.*, 'towns', 4096, 'geom') AS tile
+FROM tile_towns
+WHERE geom IS NOT NULL;
\ No newline at end of file
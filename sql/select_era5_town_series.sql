@@ -0,0 +1,11 @@
+SELECT m.date,
+    m.t2m,
+    m.tp,
+    m.t2m_min,
+    m.t2m_max,
+    m.max_nocturnal_temp,
+    m.min_diurnal_temp,
+    m.diurnal_temp_variation
+FROM era5_measurements m
+WHERE m.town_id = :town_id
+ORDER BY m.date;
\ No newline at end of file
@@ -0,0 +1,50 @@
+-- Both sources of each town and date on one row, with the columns of a source
+-- left null on dates it has no values for
+WITH e AS (
+    SELECT m.date,
+        m.town_id,
+        m.t2m,
+        m.tp,
+        m.t2m_min,
+        m.t2m_max,
+        m.max_nocturnal_temp,
+        m.min_diurnal_temp,
+        m.diurnal_temp_variation
+    FROM era5_measurements m
+    WHERE m.date BETWEEN :start_date AND :end_date
+),
+n AS (
+    SELECT m.date,
+        m.town_id,
+        m.ndvi
+    FROM modis_measurements m
+    WHERE m.date BETWEEN :start_date AND :end_date
+)
+SELECT date,
+    town_id,
+    t.town_name,
+    e.t2m,
+    e.tp,
+    e.t2m_min,
+    e.t2m_max,
+    e.max_nocturnal_temp,
+    e.min_diurnal_temp,
+    e.diurnal_temp_variation,
+    n.ndvi
+FROM e
+    FULL JOIN n USING (date, town_id)
+    JOIN towns t USING (town_id)
+WHERE (
+        CAST(:ids AS INT []) IS NULL
+        OR town_id = ANY(CAST(:ids AS INT []))
+    )
+    AND (
+        CAST(:areas AS INT []) IS NULL
+        OR town_id IN (
+            SELECT w.town_id
+            FROM area_towns w
+            WHERE w.area_id = ANY(CAST(:areas AS INT []))
+        )
+    )
+ORDER BY date,
+    town_id;
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT file_name,
+    checksum
+FROM ingestion_manifest
+WHERE source = :source;
\ No newline at end of file
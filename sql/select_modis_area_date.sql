@@ -0,0 +1,7 @@
+SELECT m.area_id,
+    m.ndvi
+FROM modis_area_measurements m
+    JOIN areas a ON m.area_id = a.area_id
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE a.level = :level
+    AND ti.date = :date;
\ No newline at end of file
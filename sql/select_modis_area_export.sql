@@ -0,0 +1,15 @@
+SELECT ti.date,
+    m.area_id,
+    a.area_name,
+    m.ndvi
+FROM modis_area_measurements m
+    JOIN areas a ON m.area_id = a.area_id
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE a.level = :level
+    AND ti.date BETWEEN :start_date AND :end_date
+    AND (
+        CAST(:ids AS INT []) IS NULL
+        OR m.area_id = ANY(CAST(:ids AS INT []))
+    )
+ORDER BY m.time_id,
+    m.area_id;
\ No newline at end of file
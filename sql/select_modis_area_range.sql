@@ -0,0 +1,10 @@
+SELECT ti.date,
+    m.area_id,
+    m.ndvi
+FROM modis_area_measurements m
+    JOIN areas a ON m.area_id = a.area_id
+    JOIN time ti ON m.time_id = ti.time_id
+WHERE a.level = :level
+    AND ti.date BETWEEN :start_date AND :end_date
+ORDER BY ti.date,
+    m.area_id;
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT m.town_id,
+    m.ndvi
+FROM modis_measurements m
+WHERE m.date = :date;
\ No newline at end of file
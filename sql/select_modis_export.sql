@@ -0,0 +1,21 @@
+SELECT m.date,
+    m.town_id,
+    t.town_name,
+    m.ndvi
+FROM modis_measurements m
+    JOIN towns t ON m.town_id = t.town_id
+WHERE m.date BETWEEN :start_date AND :end_date
+    AND (
+        CAST(:ids AS INT []) IS NULL
+        OR m.town_id = ANY(CAST(:ids AS INT []))
+    )
+    AND (
+        CAST(:areas AS INT []) IS NULL
+        OR m.town_id IN (
+            SELECT w.town_id
+            FROM area_towns w
+            WHERE w.area_id = ANY(CAST(:areas AS INT []))
+        )
+    )
+ORDER BY m.date,
+    m.town_id;
\ No newline at end of file
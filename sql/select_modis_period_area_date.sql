@@ -0,0 +1,11 @@
+-- Area-weighted means of the town values of a period
+SELECT w.area_id,
+    SUM(m.ndvi * w.weight)
+        / NULLIF(SUM(w.weight) FILTER (WHERE m.ndvi IS NOT NULL), 0) AS ndvi
+FROM modis_period_measurements m
+    JOIN area_towns w ON m.town_id = w.town_id
+    JOIN areas a ON w.area_id = a.area_id
+WHERE a.level = :level
+    AND m.resolution = :resolution
+    AND m.period_start = :date
+GROUP BY w.area_id;
\ No newline at end of file
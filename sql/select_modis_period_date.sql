@@ -0,0 +1,5 @@
+SELECT m.town_id,
+    m.ndvi
+FROM modis_period_measurements m
+WHERE m.resolution = :resolution
+    AND m.period_start = :date;
\ No newline at end of file
@@ -0,0 +1,7 @@
+SELECT m.date,
+    m.town_id,
+    m.ndvi
+FROM modis_measurements m
+WHERE m.date BETWEEN :start_date AND :end_date
+ORDER BY m.date,
+    m.town_id;
\ No newline at end of file
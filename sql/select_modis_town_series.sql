@@ -0,0 +1,5 @@
+SELECT m.date,
+    m.ndvi
+FROM modis_measurements m
+WHERE m.town_id = :town_id
+ORDER BY m.date;
\ No newline at end of file
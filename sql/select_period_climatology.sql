@@ -0,0 +1,8 @@
+SELECT variable,
+    p02,
+    p98,
+    min_value,
+    max_value,
+    n_values
+FROM period_climatology
+WHERE resolution = :resolution;
\ No newline at end of file
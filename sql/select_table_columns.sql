@@ -0,0 +1,7 @@
+SELECT attname AS column_name,
+    format_type(atttypid, atttypmod) AS data_type
+FROM pg_attribute
+WHERE attrelid = CAST(:table AS REGCLASS)
+    AND attnum > 0
+    AND NOT attisdropped
+ORDER BY attnum;
\ No newline at end of file
@@ -0,0 +1,7 @@
+SELECT t.town_id,
+    t.town_name,
+    l.geometry
+FROM towns t
+    JOIN towns_lod l ON t.town_id = l.town_id
+WHERE l.tolerance = :tolerance
+ORDER BY t.town_id;
\ No newline at end of file
@@ -0,0 +1,12 @@
+-- Years covered by the files loaded since the last data version, which the
+-- Parquet store and the value cube have not picked up yet
+SELECT DISTINCT generate_series(
+        CAST(EXTRACT(YEAR FROM m.start_date) AS INT),
+        CAST(EXTRACT(YEAR FROM m.end_date) AS INT)
+    ) AS year
+FROM ingestion_manifest m
+WHERE m.loaded_at > (
+        SELECT COALESCE(MAX(v.ingested_at), '-infinity')
+        FROM data_version v
+    )
+ORDER BY year;
\ No newline at end of file
@@ -0,0 +1,7 @@
+SELECT variable,
+    p02,
+    p98,
+    min_value,
+    max_value,
+    n_values
+FROM variable_climatology;
\ No newline at end of file
@@ -0,0 +1,5 @@
+SELECT ti.date
+FROM variable_stats vs
+    JOIN time ti ON vs.time_id = ti.time_id
+WHERE vs.variable = :variable
+ORDER BY ti.date;
\ No newline at end of file
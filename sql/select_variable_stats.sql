@@ -0,0 +1,9 @@
+SELECT vs.variable,
+    vs.p02,
+    vs.p98,
+    vs.min_value,
+    vs.max_value,
+    vs.n_values
+FROM variable_stats vs
+    JOIN time ti ON vs.time_id = ti.time_id
+WHERE ti.date = :date;
\ No newline at end of file
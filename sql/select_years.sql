@@ -0,0 +1,6 @@
+SELECT year,
+    MIN(time_id) AS start_time_id,
+    MAX(time_id) AS end_time_id
+FROM time
+GROUP BY year
+ORDER BY year;
\ No newline at end of file
@@ -0,0 +1,22 @@
+INSERT INTO ingestion_manifest (
+        source,
+        file_name,
+        checksum,
+        row_count,
+        start_date,
+        end_date
+    )
+VALUES (
+        :source,
+        :file_name,
+        :checksum,
+        :row_count,
+        :start_date,
+        :end_date
+    ) ON CONFLICT (source, file_name) DO
+UPDATE
+SET checksum = EXCLUDED.checksum,
+    row_count = EXCLUDED.row_count,
+    start_date = EXCLUDED.start_date,
+    end_date = EXCLUDED.end_date,
+    loaded_at = now();
\ No newline at end of file
@@ -1,8 +1,12 @@
+from threading import Thread
+
 import dash
 
-from app_callbacks import register_callbacks
-from app_layout import layout
-from definitions import ASSETS_PATH
+from app_callbacks import figure_cache, register_callbacks
+from app_export import register_export
+from app_layout import serve_layout
+from app_tiles import register_tiles, tile_cache
+from definitions import ASSETS_PATH, DATA_BACKEND
 
 # External stylesheets
 external_stylesheets = [
@@ -14,21 +18,76 @@ external_stylesheets = [
     },
 ]
 
-# Initialize the Dash app
-app = dash.Dash(
-    __name__,
-    external_stylesheets=external_stylesheets,
-    assets_folder=ASSETS_PATH,
-)
 
-app.title = "Geodashboard"
+def warm_up():
+    """
+    Load the data modules, the base figure with the town geometries and the
+    NDVI date catalog in the background, so the worker can serve health checks
+    meanwhile and the first map request finds them ready
+    """
+    from app_data_fetcher import (
+        INITIAL_ZOOM,
+        base_figure,
+        geometry_tolerance,
+        get_ndvi_dates,
+    )
+
+    base_figure(level="town", tolerance=geometry_tolerance(INITIAL_ZOOM))
+    get_ndvi_dates()
+
+
+def create_app() -> dash.Dash:
+    """
+    Build the dashboard with its layout, callbacks and extra routes. Each
+    gunicorn worker calls this once after forking, so no database connection
+    or warm-up thread is shared between processes
+    """
+    app = dash.Dash(
+        __name__,
+        external_stylesheets=external_stylesheets,
+        assets_folder=ASSETS_PATH,
+    )
+
+    app.title = "Geodashboard"
+
+    # Set the layout, built again on every page load
+    app.layout = serve_layout
+
+    # Register the callbacks
+    register_callbacks(app)
+
+    # Serve the town polygons as vector tiles and stream measurement exports
+    # for analysts from the underlying Flask server. Both run PostGIS and
+    # server-side cursor queries, so they need the Postgres backend
+    if DATA_BACKEND == "postgres":
+        register_tiles(app.server)
+        register_export(app.server)
+
+    @app.server.route("/cache-stats")
+    def cache_stats():
+        """
+        Expose the hit/miss counters of this worker's caches
+        """
+        from app_data_fetcher import shared_cache
+
+        return {
+            "figures": figure_cache.stats(),
+            "tiles": tile_cache.stats(),
+            "shared": shared_cache.stats(),
+        }
+
+    @app.server.route("/health")
+    def health():
+        """
+        Liveness check that answers without touching the database
+        """
+        return "ok"
+
+    Thread(target=warm_up, name="warm-up", daemon=True).start()
 
-# Set the layout
-app.layout = layout
+    return app
 
-# Register the callbacks
-register_callbacks(app)
 
-# Run the server
+# Run the development server
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    create_app().run_server(debug=True)
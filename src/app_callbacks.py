@@ -1,66 +1,259 @@
 from datetime import date
 
-import pandas as pd
-import plotly.express as px
-from dash import Input, Output
+import numpy as np
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx, no_update
+from plotly.colors import get_colorscale
 
-from app_data_fetcher import fetch_available_ndvi_dates, query_measurements
+from caching import LRUCache
+from definitions import (
+    ANIMATION_CACHE_MAX_BYTES,
+    ANIMATION_CHUNK_FRAMES,
+    FIGURE_CACHE_MAX_BYTES,
+)
 
-ndvi_dates = fetch_available_ndvi_dates()
+# NOTE: app_data_fetcher (and with it pandas, geopandas and SQLAlchemy) is
+# imported inside the callbacks, so that workers can bind and answer health
+# checks before loading it
+
+# Window of the rolling mean drawn over the town series, in samples (days for
+# ERA5, composites for NDVI)
+ROLLING_MEAN_WINDOW = 30
+
+# Figure updates keyed by (variable, date, level, colour scale mode,
+# resolution). The data is read-only between ingestion runs, so entries only
+# go stale when the data version changes
+figure_cache = LRUCache(
+    max_bytes=FIGURE_CACHE_MAX_BYTES, sizeof=lambda update: update["z"].nbytes
+)
+
+
+# Time-lapse frames keyed by (variable, start date, end date, level), so
+# streaming the chunks of a time-lapse runs its range query once
+animation_cache = LRUCache(
+    max_bytes=ANIMATION_CACHE_MAX_BYTES, sizeof=lambda frames: frames["z"].nbytes
+)
+
+
+def variable_style(variable) -> tuple[str, str, float, float]:
+    """
+    Return the units, colour scale and default colour range of a variable
+    """
+    temperatures = [
+        "t2m",
+        "t2m_min",
+        "t2m_max",
+        "max_nocturnal_temp",
+        "min_diurnal_temp",
+        "diurnal_temp_variation",
+    ]
+    precipitation = "tp"
+
+    if variable in temperatures:
+        units = "Temperature (K)"
+        cmap = "RdBu_r"
+        lowers = -5
+        uppers = 5
+    elif variable == precipitation:
+        units = "Total precipitation (mm)"
+        cmap = "RdBu"
+        lowers = -50
+        uppers = 50
+    else:
+        units = "NDVI"
+        cmap = "RdYlGn"
+        lowers = 0.2
+        uppers = 0.8
+
+    return units, cmap, lowers, uppers
+
+
+def build_figure_update(variable, date, level, scale, resolution) -> dict:
+    """
+    Query the measurements of a variable for a date, or the month, season or
+    year it falls in, at an aggregation level and return the choropleth trace
+    properties that change between updates: values, colour scale and range. The
+    range is the fixed one of the variable, or the percentiles precomputed
+    during ingestion for the date or the whole record at the resolution.
+    Precomputed per-date percentiles are daily, so periods take theirs from
+    the values on the map
+    """
+    from app_data_fetcher import fetch_colour_range, query_measurements
+
+    units, cmap, lowers, uppers = variable_style(variable)
+    values = query_measurements(
+        variable=variable, date=date, level=level, resolution=resolution
+    )
+
+    colour_range = None
+    if scale == "climatology" or (scale == "date" and resolution == "day"):
+        colour_range = fetch_colour_range(
+            variable=variable, date=date, mode=scale, resolution=resolution
+        )
+    elif scale == "date" and values.notna().any():
+        colour_range = tuple(np.nanpercentile(values, [2, 98]))
+    if colour_range is not None:
+        lowers, uppers = colour_range
+        # Keep anomaly scales centred on zero
+        if variable != "ndvi":
+            uppers = max(abs(lowers), abs(uppers))
+            lowers = -uppers
+
+    return {
+        "z": values.to_numpy(dtype=float),
+        "zmin": lowers,
+        "zmax": uppers,
+        # Resolve named scales here since plotly.js does not know the '_r' ones
+        "colorscale": get_colorscale(cmap),
+        "colorbar": {"title": {"text": units}},
+    }
+
+
+def build_animation_frames(variable, start_date, end_date, level) -> dict:
+    """
+    Fetch a variable over a date range with one query and return the dates of
+    the frames and a (dates, towns) matrix with their values, in the order of
+    the map locations. Every frame reuses the geometries already on the map
+    """
+    from app_data_fetcher import query_measurement_frames
+
+    frames = query_measurement_frames(
+        variable=variable, start_date=start_date, end_date=end_date, level=level
+    )
+    return {
+        "dates": frames.index.strftime("%Y-%m-%d").to_list(),
+        "z": frames.to_numpy(dtype=float),
+    }
+
+
+def build_town_series_figure(town_id, variable):
+    """
+    Draw the full time series of a variable for a town with its rolling mean,
+    and the NDVI composites on a secondary axis
+    """
+    from plotly.subplots import make_subplots
+
+    from app_data_fetcher import fetch_town_series, load_towns
+
+    town_name = load_towns().loc[town_id, "town_name"]
+    units = variable_style(variable)[0]
+    series = fetch_town_series(town_id=town_id)
+    values = series[variable].dropna()
+    rolling_mean = values.rolling(ROLLING_MEAN_WINDOW, center=True).mean()
+
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    # WebGL traces, since a daily series has ~27,000 points
+    fig.add_scattergl(
+        x=values.index,
+        y=values,
+        name=units,
+        mode="lines",
+        line={"color": "lightgrey", "width": 1},
+    )
+    fig.add_scattergl(
+        x=rolling_mean.index,
+        y=rolling_mean,
+        name=f"{ROLLING_MEAN_WINDOW}-step rolling mean",
+        mode="lines",
+        line={"color": "#034353", "width": 2},
+    )
+    if variable != "ndvi":
+        ndvi = series["ndvi"].dropna()
+        fig.add_scattergl(
+            x=ndvi.index,
+            y=ndvi,
+            name="NDVI",
+            mode="markers",
+            marker={"color": "green", "size": 3},
+            secondary_y=True,
+        )
+        fig.update_yaxes(title_text="NDVI", secondary_y=True)
+
+    fig.update_yaxes(title_text=units, secondary_y=False)
+    fig.update_layout(
+        title=town_name,
+        template="plotly_white",
+        legend={"orientation": "h"},
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+    )
+    return fig
 
 
 def register_callbacks(app):
     @app.callback(
         Output(component_id="graph", component_property="figure"),
+        Output(component_id="geometry-key", component_property="data"),
         [
             Input(component_id="variable-filter", component_property="value"),
             Input(component_id="date-filter", component_property="date"),
+            Input(component_id="level-filter", component_property="value"),
+            Input(component_id="scale-filter", component_property="value"),
+            Input(component_id="resolution-filter", component_property="value"),
+            Input(component_id="graph", component_property="relayoutData"),
         ],
+        State(component_id="geometry-key", component_property="data"),
+        State(component_id="session-id", component_property="data"),
     )
-    def update_graph(variable, date):
-        temperatures = [
-            "t2m",
-            "t2m_min",
-            "t2m_max",
-            "max_nocturnal_temp",
-            "min_diurnal_temp",
-            "diurnal_temp_variation",
-        ]
-        precipitation = "tp"
-
-        if variable in temperatures:
-            units = "Temperature (K)"
-            cmap = "RdBu_r"
-            lowers = -5
-            uppers = 5
-        elif variable == precipitation:
-            units = "Total precipitation (mm)"
-            cmap = "RdBu"
-            lowers = -50
-            uppers = 50
+    def update_graph(
+        variable, date, level, scale, resolution, relayout_data, current_key, session
+    ):
+        from app_data_fetcher import (
+            INITIAL_ZOOM,
+            base_figure,
+            geometry_tolerance,
+            get_data_version,
+            prefetch_neighbours,
+        )
+
+        # Pick the level of detail from the zoom. Relayouts that did not zoom,
+        # like panning, keep the current one
+        current_tolerance = current_key[1] if current_key is not None else None
+        zoom = (relayout_data or {}).get("map.zoom")
+        if zoom is not None:
+            tolerance = geometry_tolerance(zoom)
+        elif current_tolerance is not None:
+            tolerance = current_tolerance
         else:
-            units = "NDVI"
-            cmap = "RdYlGn"
-            lowers = 0.2
-            uppers = 0.8
-
-        gdf = query_measurements(variable=variable, date=date)
-        # lowers = gdf[variable].quantile(0.02)
-        # uppers = gdf[variable].quantile(0.98)
-        fig = px.choropleth_map(
-            gdf,
-            geojson=gdf.geometry,
-            locations=gdf.index,
-            color=variable,
-            color_continuous_scale=cmap,
-            range_color=(lowers, uppers),
-            map_style="carto-positron",
-            zoom=5.25,
-            center={"lat": 40, "lon": -3},
-            opacity=0.5,
-            labels={variable: units},
+            tolerance = geometry_tolerance(INITIAL_ZOOM)
+        key = [level, tolerance]
+
+        if ctx.triggered_id == "graph" and key == current_key:
+            return no_update, no_update
+
+        figure_cache.validate(get_data_version())
+        update = figure_cache.get_or_compute(
+            (variable, date, level, scale, resolution),
+            lambda: build_figure_update(
+                variable=variable,
+                date=date,
+                level=level,
+                scale=scale,
+                resolution=resolution,
+            ),
         )
-        return fig
+        z = np.where(np.isnan(update["z"]), None, update["z"]).tolist()
+        # Neighbouring days are only worth loading when stepping through days
+        if ctx.triggered_id != "graph" and resolution == "day":
+            prefetch_neighbours(
+                variable=variable, date=date, level=level, session=session
+            )
+
+        # The first update of a session sends the whole map with the geometries
+        if current_key is None:
+            figure = base_figure(level=level, tolerance=tolerance)
+            trace = {**figure["data"][0], **update, "z": z}
+            return {**figure, "data": [trace]}, key
+
+        # Later ones only send the values and colour scale, plus the geometries
+        # when the zoom crossed into another level of detail or the aggregation
+        # level changed
+        patched_trace = {**update, "z": z}
+        if key != current_key:
+            trace = base_figure(level=level, tolerance=tolerance)["data"][0]
+            for name in ["geojson", "locations", "text"]:
+                patched_trace[name] = trace[name]
+        patched_figure = Patch()
+        patched_figure["data"][0].update(patched_trace)
+        return patched_figure, key
 
     @app.callback(
         Output(component_id="date-filter", component_property="min_date_allowed"),
@@ -70,9 +263,12 @@ def register_callbacks(app):
         Input(component_id="date-filter", component_property="date"),
     )
     def update_date_picker(variable, selected_date):
-        ndvi_dates
+        import pandas as pd
+
+        from app_data_fetcher import get_ndvi_dates
 
         if variable == "ndvi":
+            ndvi_dates = get_ndvi_dates()
             min_ndvi_date = ndvi_dates.min().strftime("%Y-%m-%d")
             max_ndvi_date = ndvi_dates.max().strftime("%Y-%m-%d")
             selected_date = pd.to_datetime(selected_date)
@@ -86,3 +282,118 @@ def register_callbacks(app):
             return min_ndvi_date, max_ndvi_date, selected_date
         else:
             return date(1950, 1, 1), date(2024, 7, 15), selected_date
+
+    @app.callback(
+        Output(component_id="animation-chunk", component_property="data"),
+        Output(component_id="animation-stream", component_property="disabled"),
+        Output(component_id="animation-clock", component_property="disabled"),
+        Output(component_id="animation-clock", component_property="n_intervals"),
+        Output(
+            component_id="animation-date",
+            component_property="children",
+            allow_duplicate=True,
+        ),
+        Input(component_id="play-button", component_property="n_clicks"),
+        Input(component_id="animation-stream", component_property="n_intervals"),
+        Input(component_id="variable-filter", component_property="value"),
+        Input(component_id="level-filter", component_property="value"),
+        Input(component_id="resolution-filter", component_property="value"),
+        Input(component_id="date-filter", component_property="date"),
+        State(component_id="end-date-filter", component_property="date"),
+        State(component_id="animation-chunk", component_property="data"),
+        prevent_initial_call=True,
+    )
+    def stream_animation(
+        n_clicks, n_intervals, variable, level, resolution, start, end, chunk
+    ):
+        from app_data_fetcher import get_data_version
+
+        # Switching variable, aggregation level, resolution or date stops the
+        # time-lapse, so its frames do not paint over the new map
+        if ctx.triggered_id in [
+            "variable-filter",
+            "level-filter",
+            "resolution-filter",
+            "date-filter",
+        ]:
+            return None, True, True, no_update, ""
+
+        # Frames are daily, so there is no time-lapse of period maps
+        if ctx.triggered_id == "play-button" and resolution != "day":
+            return no_update, True, True, no_update, no_update
+
+        # Play sends the first chunk and starts the clock, and each tick of the
+        # stream interval sends the next one until every frame is out
+        if ctx.triggered_id == "play-button":
+            key, offset = (variable, start, end, level), 0
+        elif chunk is not None:
+            key, offset = tuple(chunk["key"]), chunk["offset"] + len(chunk["dates"])
+        else:
+            return no_update, True, no_update, no_update, no_update
+
+        animation_cache.validate(get_data_version())
+        frames = animation_cache.get_or_compute(
+            key, lambda: build_animation_frames(*key)
+        )
+        stop = offset + ANIMATION_CHUNK_FRAMES
+        z = frames["z"][offset:stop]
+        chunk = {
+            "key": list(key),
+            "offset": offset,
+            "total": len(frames["dates"]),
+            "dates": frames["dates"][offset:stop],
+            "z": np.where(np.isnan(z), None, z).tolist(),
+        }
+        done = stop >= chunk["total"]
+
+        if ctx.triggered_id == "play-button":
+            return chunk, done, False, 0, no_update
+        return chunk, done, no_update, no_update, no_update
+
+    @app.callback(
+        Output(component_id="play-button", component_property="disabled"),
+        Input(component_id="resolution-filter", component_property="value"),
+    )
+    def toggle_play_button(resolution):
+        # Time-lapse frames are daily values
+        return resolution != "day"
+
+    # Frames are appended and drawn in the browser (assets/animation.js), so
+    # playback needs no round-trip per frame
+    app.clientside_callback(
+        ClientsideFunction(namespace="animation", function_name="append_chunk"),
+        Output(component_id="animation-frames", component_property="data"),
+        Input(component_id="animation-chunk", component_property="data"),
+        State(component_id="animation-frames", component_property="data"),
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="animation", function_name="show_frame"),
+        Output(component_id="graph", component_property="figure", allow_duplicate=True),
+        Output(component_id="animation-date", component_property="children"),
+        Output(
+            component_id="animation-clock",
+            component_property="disabled",
+            allow_duplicate=True,
+        ),
+        Input(component_id="animation-clock", component_property="n_intervals"),
+        # Also redraw when frames arrive, in case the clock got there first
+        Input(component_id="animation-frames", component_property="data"),
+        State(component_id="graph", component_property="figure"),
+        prevent_initial_call=True,
+    )
+
+    @app.callback(
+        Output(component_id="town-series", component_property="figure"),
+        Input(component_id="graph", component_property="clickData"),
+        Input(component_id="variable-filter", component_property="value"),
+        State(component_id="level-filter", component_property="value"),
+    )
+    def update_town_series(click_data, variable, level):
+        # Series are only kept per town
+        if click_data is None or level != "town":
+            return no_update
+
+        # The map locations are town ids
+        town_id = click_data["points"][0]["location"]
+        return build_town_series_figure(town_id=town_id, variable=variable)
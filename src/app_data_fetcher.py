@@ -1,61 +1,588 @@
+import time
+from functools import cache
+
 import geopandas as gpd
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 from shapely import from_wkb
-from sqlalchemy import create_engine, text
-
-from definitions import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
-from utils import read_sql_query
-
-variables = {
-    "Total precipitation (mm)": "tp",
-    "Mean temperature 2m (K)": "t2m",
-    "Minimum temperature 2m (K)": "t2m_min",
-    "Maximum temperature 2m (K)": "t2m_max",
-    "Maximum nocturnal temperature (K)": "max_nocturnal_temp",
-    "Minimum diurnal temperature (K)": "min_diurnal_temp",
-    "Diurnal temperature variation (K)": "diurnal_temp_variation",
-    "NDVI": "ndvi",
-}
-
-engine = create_engine(
-    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+from sqlalchemy import Engine, create_engine
+
+from backends import DuckDBBackend, PostgresBackend
+from caching import DiskCache, LRUCache
+from definitions import (
+    ANIMATION_MAX_DAYS,
+    CUBE_PATH,
+    DATA_BACKEND,
+    DATA_VERSION_CHECK_SECONDS,
+    DATE_CACHE_MAX_BYTES,
+    DB_HOST,
+    DB_MAX_OVERFLOW,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_PORT,
+    DB_USER,
+    GEOMETRY_LODS,
+    PARQUET_PATH,
+    PREFETCH_RADIUS,
+    PREFETCH_WORKERS,
+    SERIES_CACHE_MAX_BYTES,
+    SHARED_CACHE_MAX_BYTES,
+    SHARED_CACHE_PATH,
+    aggregation_levels,
+    source_variables,
+    temporal_resolutions,
+    variable_sources,
+)
+from prefetcher import Prefetcher
+from value_cube import ValueCube, open_value_cube
+
+# Per-date query files, keyed by source, towns or areas (provinces and regions)
+# and daily or period (month, season, year) values
+date_queries = {}
+for source in source_variables:
+    date_queries[source, "town", "day"] = f"select_{source}_date.sql"
+    date_queries[source, "area", "day"] = f"select_{source}_area_date.sql"
+    date_queries[source, "town", "period"] = f"select_{source}_period_date.sql"
+    date_queries[source, "area", "period"] = f"select_{source}_period_area_date.sql"
+
+
+@cache
+def get_engine() -> Engine:
+    """
+    Create the database engine on first use, so importing this module does not
+    need the database
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return engine
+
+
+@cache
+def get_backend() -> PostgresBackend | DuckDBBackend:
+    """
+    Create the storage backend picked by DATA_BACKEND on first use. Every read
+    of this module goes through it
+    """
+    if DATA_BACKEND == "postgres":
+        return PostgresBackend(get_engine)
+    if DATA_BACKEND == "duckdb":
+        return DuckDBBackend(PARQUET_PATH)
+    raise ValueError(f"Unknown data backend: {DATA_BACKEND}")
+
+
+# Geometries and per-date row sets shared by the worker processes of the host,
+# so each is read from the database once per data version
+shared_cache = DiskCache(directory=SHARED_CACHE_PATH, max_bytes=SHARED_CACHE_MAX_BYTES)
+
+# Row sets with every variable of a source for a date, keyed by
+# (source, date, level, resolution)
+date_cache = LRUCache(
+    max_bytes=DATE_CACHE_MAX_BYTES,
+    sizeof=lambda df: int(df.memory_usage(deep=True).sum()),
 )
 
+# Zoom of the map when a session starts
+INITIAL_ZOOM = 5.25
+
+# Full time series of every variable for a town, keyed by town_id
+series_cache = LRUCache(
+    max_bytes=SERIES_CACHE_MAX_BYTES,
+    sizeof=lambda df: int(df.memory_usage(deep=True).sum()),
+)
+
+# Last ingestion version stamp read from the database and when it was read
+data_version = {"version": None, "checked_at": float("-inf")}
+
+# NDVI composite dates and the data version they were read for
+ndvi_date_catalog = {"version": None, "dates": None}
+
+# Typical range of every variable by resolution, and the data version it was
+# read for
+climatology = {"version": None, "stats": {}}
+
+# Memory-mapped value cube of the data version, None when there is none, and
+# when it was last looked for
+value_cube = {"version": None, "cube": None, "checked_at": float("-inf")}
+
+# Geometries and base figures of the data version they were loaded for, keyed
+# by what they were loaded for. They are few and large, so they are kept until
+# the version changes
+geometry_cache = {"version": None, "entries": {}}
+
 
 def fetch_available_ndvi_dates():
-    fetch_ndvi_dates = read_sql_query("fetch_ndvi_dates.sql")
-    ndvi_dates = pd.read_sql(sql=text(fetch_ndvi_dates), con=engine)
+    ndvi_dates = get_backend().read_frame("fetch_ndvi_dates.sql")
     return pd.to_datetime(ndvi_dates["date"]).sort_values()
 
 
-def blank_figure():
-    fig = px.scatter()
-    fig.update_layout(template=None)
-    fig.update_xaxes(showgrid=False, showticklabels=False, zeroline=False)
-    fig.update_yaxes(showgrid=False, showticklabels=False, zeroline=False)
-    return fig
-
-
-def query_measurements(variable, date):
-    allowed_variables = {
-        "tp": "select_tp.sql",
-        "t2m": "select_t2m.sql",
-        "t2m_min": "select_t2m_min.sql",
-        "t2m_max": "select_t2m_max.sql",
-        "max_nocturnal_temp": "select_max_nocturnal_temp.sql",
-        "min_diurnal_temp": "select_min_diurnal_temp.sql",
-        "diurnal_temp_variation": "select_diurnal_temp_variation.sql",
-        "ndvi": "select_ndvi.sql",
-    }
+def get_ndvi_dates() -> pd.Series:
+    """
+    Return the sorted dates with NDVI composites. The catalog is read on first
+    use and again after each ingestion run
+    """
+    version = get_data_version()
+    if ndvi_date_catalog["version"] != version:
+        ndvi_date_catalog["dates"] = fetch_available_ndvi_dates()
+        ndvi_date_catalog["version"] = version
+    return ndvi_date_catalog["dates"]
+
+
+def get_data_version() -> int:
+    """
+    Return the version stamp of the last ingestion run. The backend is queried
+    at most once every DATA_VERSION_CHECK_SECONDS
+    """
+    now = time.monotonic()
+    if now - data_version["checked_at"] >= DATA_VERSION_CHECK_SECONDS:
+        version = get_backend().read_frame("select_data_version.sql")["version"]
+        data_version["version"] = int(version.iloc[0])
+        data_version["checked_at"] = now
+    return data_version["version"]
+
+
+def get_value_cube() -> ValueCube | None:
+    """
+    Return the value cube exported for the current data version, or None. A
+    missing cube is looked for again every DATA_VERSION_CHECK_SECONDS, since it
+    is exported after the ingestion run that bumps the version
+    """
+    version = get_data_version()
+    now = time.monotonic()
+    if value_cube["version"] != version or (
+        value_cube["cube"] is None
+        and now - value_cube["checked_at"] >= DATA_VERSION_CHECK_SECONDS
+    ):
+        value_cube["cube"] = open_value_cube(CUBE_PATH, version)
+        value_cube["version"] = version
+        value_cube["checked_at"] = now
+    return value_cube["cube"]
+
+
+def geometry_tolerance(zoom: float) -> float:
+    """
+    Return the simplification tolerance of the level of detail for a map zoom
+    """
+    return [tolerance for min_zoom, tolerance in GEOMETRY_LODS if zoom >= min_zoom][-1]
+
+
+def read_town_geometries(tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Read every town geometry, indexed by town_id, at the level of detail of a
+    simplification tolerance. Geometries arrive as hex EWKB strings from
+    Postgres or WKB bytes from Parquet and are decoded in one vectorised call
+    """
+    df = get_backend().read_frame(
+        "select_town_lod_geometries.sql",
+        params={"tolerance": tolerance},
+        index_col="town_id",
+    )
+    geometry = from_wkb(df.pop("geometry").to_numpy())
+    return gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+
+
+def get_or_load_geometry(key, load):
+    """
+    Return the geometries or base figure cached under key, loading them on a
+    miss. Every entry is dropped when the data version changes, since the
+    towns, their levels of detail or the areas may have been rebuilt
+    """
+    version = get_data_version()
+    if geometry_cache["version"] != version:
+        geometry_cache["entries"] = {}
+        geometry_cache["version"] = version
+    entries = geometry_cache["entries"]
+    if key not in entries:
+        entries[key] = load()
+    return entries[key]
+
+
+def load_town_geometries(tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Return the town geometries at a level of detail. Geometries are simplified
+    once when creating the 'towns_lod' table and never change between
+    ingestion runs, so each level is loaded once per process and data version,
+    from the shared cache when another worker already read it
+    """
+    return get_or_load_geometry(
+        ("towns", tolerance),
+        lambda: shared_cache.get_or_compute(
+            ("towns", tolerance),
+            get_data_version(),
+            lambda: read_town_geometries(tolerance=tolerance),
+        ),
+    )
+
+
+def load_towns() -> gpd.GeoDataFrame:
+    """
+    Return the towns at the level of detail of the initial map view. Every
+    level lists the same towns in the same order, so this also gives the order
+    of the map locations
+    """
+    return load_town_geometries(tolerance=geometry_tolerance(INITIAL_ZOOM))
+
+
+def read_area_geometries(level: str, tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Read the dissolved geometries of every province or region, indexed by
+    area_id. There are few enough of them for Postgres to simplify on the fly,
+    while the Parquet store holds them already simplified
+    """
+    df = get_backend().read_frame(
+        "select_area_geometries.sql",
+        params={"level": level, "tolerance": tolerance},
+        index_col="area_id",
+    )
+    geometry = from_wkb(df.pop("geometry").to_numpy())
+    return gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
+
+
+def load_geometries(level: str, tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Return the geometries of an aggregation level ('town', 'province' or
+    'region') at a level of detail, indexed by town_id or area_id and with their
+    names in a 'name' column
+    """
+    return get_or_load_geometry(
+        ("locations", level, tolerance),
+        lambda: read_geometries(level=level, tolerance=tolerance),
+    )
+
+
+def read_geometries(level: str, tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Read the geometries of an aggregation level from the shared cache or the
+    backend, with their names in a 'name' column
+    """
+    if level == "town":
+        gdf = load_town_geometries(tolerance=tolerance)
+        return gdf.rename(columns={"town_name": "name"})
+
+    gdf = shared_cache.get_or_compute(
+        ("areas", level, tolerance),
+        get_data_version(),
+        lambda: read_area_geometries(level=level, tolerance=tolerance),
+    )
+    return gdf.rename(columns={"area_name": "name"})
+
+
+def load_locations(level: str) -> gpd.GeoDataFrame:
+    """
+    Return the towns or areas of a level at the level of detail of the initial
+    map view. This gives the order of the map locations at that level
+    """
+    return load_geometries(level=level, tolerance=geometry_tolerance(INITIAL_ZOOM))
 
-    if variable not in allowed_variables:
+
+def base_figure(level: str, tolerance: float) -> dict:
+    """
+    Return the choropleth map of every town, province or region without
+    values, drawn once per process and data version. This is the only figure
+    that carries the geometries: it is sent to the browser once per session
+    and later callbacks only patch its values, or its geometries when the zoom
+    needs another level of detail or the user picks another aggregation level
+    """
+    return get_or_load_geometry(
+        ("figure", level, tolerance),
+        lambda: draw_base_figure(level=level, tolerance=tolerance),
+    )
+
+
+def draw_base_figure(level: str, tolerance: float) -> dict:
+    """
+    Draw the choropleth map of the geometries of a level without values
+    """
+    locations = load_geometries(level=level, tolerance=tolerance)
+    fig = go.Figure(
+        go.Choroplethmap(
+            geojson=locations.geometry.__geo_interface__,
+            locations=locations.index,
+            z=[None] * len(locations),
+            text=locations["name"],
+            hovertemplate="<b>%{text}</b><br>%{z:.2f}<extra></extra>",
+            marker={"opacity": 0.5},
+        )
+    )
+    fig.update_layout(
+        map={
+            "style": "carto-positron",
+            "zoom": INITIAL_ZOOM,
+            "center": {"lat": 40, "lon": -3},
+        },
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        # Keep the user's view when the geometries are swapped
+        uirevision="map",
+    )
+    # Keep it as a plain dict so callbacks can fill in values without copying
+    # the geometries
+    return fig.to_plotly_json()
+
+
+def period_start(resolution, date) -> pd.Timestamp:
+    """
+    Return the first day of the month, season or year a date falls in, like the
+    period_start() SQL function. Days are their own period
+    """
+    date = pd.to_datetime(date).normalize()
+    if resolution == "month":
+        return date.to_period("M").start_time
+    if resolution == "season":
+        # Meteorological seasons: winter starts on 1 December
+        shifted = date + pd.DateOffset(months=1)
+        return shifted.to_period("Q").start_time - pd.DateOffset(months=1)
+    if resolution == "year":
+        return date.to_period("Y").start_time
+    return date
+
+
+def read_measurements(source, date, level, resolution) -> pd.DataFrame:
+    """
+    Read every variable of a source for a date, or for the period starting on
+    it, indexed by town_id for towns and by area_id for provinces and regions.
+    Daily town values come from the value cube when there is one
+    """
+    if level == "town" and resolution == "day":
+        cube = get_value_cube()
+        df = cube.date_values(source, date) if cube is not None else None
+        if df is not None:
+            return df
+
+    params = {"date": date}
+    if level != "town":
+        params["level"] = level
+    if resolution != "day":
+        params["resolution"] = resolution
+
+    query = date_queries[
+        source,
+        "town" if level == "town" else "area",
+        "day" if resolution == "day" else "period",
+    ]
+    index_col = "town_id" if level == "town" else "area_id"
+    return get_backend().read_frame(query, params=params, index_col=index_col)
+
+
+def fetch_measurements(source, date, level="town", resolution="day") -> pd.DataFrame:
+    """
+    Return every variable of a source ('era5' or 'modis') for a date at an
+    aggregation level and temporal resolution. Row sets are cached per date, or
+    per period, so switching between variables or between dates of the same
+    period needs no database access
+    """
+    if source not in source_variables:
+        raise ValueError("Invalid source")
+    if level not in aggregation_levels.values():
+        raise ValueError("Invalid level")
+    if resolution not in temporal_resolutions.values():
+        raise ValueError("Invalid resolution")
+
+    date = period_start(resolution, date).strftime("%Y-%m-%d")
+    key = (source, date, level, resolution)
+    version = get_data_version()
+    date_cache.validate(version)
+    return date_cache.get_or_compute(
+        key,
+        lambda: shared_cache.get_or_compute(
+            key, version, lambda: read_measurements(*key)
+        ),
+    )
+
+
+# Loads the dates around the one being viewed into the date cache
+prefetcher = Prefetcher(
+    load=lambda key: fetch_measurements(*key), max_workers=PREFETCH_WORKERS
+)
+
+
+def neighbouring_dates(source, date, radius) -> list[str]:
+    """
+    Return the dates within radius steps of a date, closest and later first.
+    ERA5 steps are days and MODIS steps are NDVI composites
+    """
+    date = pd.to_datetime(date)
+    steps = sorted(range(-radius, radius + 1), key=lambda step: (abs(step), step < 0))
+    steps = steps[1:]
+
+    if source == "modis":
+        ndvi_dates = get_ndvi_dates().to_numpy()
+        position = ndvi_dates.searchsorted(date.to_datetime64())
+        dates = [
+            ndvi_dates[position + step]
+            for step in steps
+            if 0 <= position + step < len(ndvi_dates)
+        ]
+    else:
+        dates = [date + pd.Timedelta(days=step) for step in steps]
+
+    return [pd.Timestamp(neighbour).strftime("%Y-%m-%d") for neighbour in dates]
+
+
+def prefetch_neighbours(variable, date, level="town", session=None) -> None:
+    """
+    Load the dates around the one a user is viewing in the background, so that
+    stepping through time finds them already cached. Pending loads around the
+    date the session viewed before are cancelled, unless another session wants
+    them
+    """
+    source = variable_sources[variable]
+    dates = neighbouring_dates(source=source, date=date, radius=PREFETCH_RADIUS)
+    prefetcher.prefetch(
+        session,
+        [
+            (source, neighbour, level, "day")
+            for neighbour in dates
+            if (source, neighbour, level, "day") not in date_cache
+        ],
+    )
+
+
+def query_measurements(variable, date, level="town", resolution="day") -> pd.Series:
+    """
+    Return the values of a variable for a date, or for the month, season or
+    year it falls in, aligned with the towns or areas of the base figure.
+    Locations without a measurement are NaN
+    """
+    if variable not in variable_sources:
+        raise ValueError("Invalid variable")
+
+    df = fetch_measurements(
+        source=variable_sources[variable],
+        date=date,
+        level=level,
+        resolution=resolution,
+    )
+    return df[variable].reindex(load_locations(level).index)
+
+
+def query_measurement_frames(
+    variable, start_date, end_date, level="town"
+) -> pd.DataFrame:
+    """
+    Return the values of a variable for every date in a range with a single
+    query, one row per date and one column per town or area of the base
+    figure, in the order of the map locations. Ranges are cut to
+    ANIMATION_MAX_DAYS
+    """
+    if variable not in variable_sources:
         raise ValueError("Invalid variable")
 
-    select_measurements = read_sql_query(allowed_variables[variable])
-    df = pd.read_sql(sql=text(select_measurements), con=engine, params={"date": date})
-    df["geometry"] = from_wkb(df["geometry"])
-    gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="EPSG:4326")
-    gdf["geometry"] = gdf.simplify(tolerance=0.0005, preserve_topology=False)
-    gdf = gdf.set_index("town_name")
-    return gdf
+    source = variable_sources[variable]
+    start_date, end_date = sorted(pd.to_datetime([start_date, end_date]))
+    end_date = min(end_date, start_date + pd.Timedelta(days=ANIMATION_MAX_DAYS - 1))
+
+    params = {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+    }
+    if level == "town":
+        select_range = f"select_{source}_range.sql"
+        location_id = "town_id"
+    else:
+        select_range = f"select_{source}_area_range.sql"
+        location_id = "area_id"
+        params["level"] = level
+
+    df = get_backend().read_frame(select_range, params=params)
+
+    frames = df.pivot(index="date", columns=location_id, values=variable)
+    return frames.reindex(columns=load_locations(level).index)
+
+
+def read_variable_stats(date) -> pd.DataFrame:
+    """
+    Read the statistics of the town values of every variable for a date,
+    indexed by variable
+    """
+    return get_backend().read_frame(
+        "select_variable_stats.sql", params={"date": date}, index_col="variable"
+    )
+
+
+def get_climatology(resolution="day") -> pd.DataFrame:
+    """
+    Return the typical range of every variable on the maps of a resolution,
+    indexed by variable. It is read on first use and again after each
+    ingestion run
+    """
+    version = get_data_version()
+    if climatology["version"] != version:
+        climatology["stats"] = {}
+        climatology["version"] = version
+    if resolution not in climatology["stats"]:
+        if resolution == "day":
+            stats = get_backend().read_frame(
+                "select_variable_climatology.sql", index_col="variable"
+            )
+        else:
+            stats = get_backend().read_frame(
+                "select_period_climatology.sql",
+                params={"resolution": resolution},
+                index_col="variable",
+            )
+        climatology["stats"][resolution] = stats
+    return climatology["stats"][resolution]
+
+
+def fetch_colour_range(
+    variable, date, mode, resolution="day"
+) -> tuple[float, float] | None:
+    """
+    Return the 2nd and 98th percentiles of the town values of a variable for a
+    date ('date' mode) or over the whole record at a resolution ('climatology'
+    mode), as computed during ingestion. None when they are missing
+    """
+    if mode == "date":
+        date = pd.to_datetime(date).strftime("%Y-%m-%d")
+        date_cache.validate(get_data_version())
+        stats = date_cache.get_or_compute(
+            ("stats", date), lambda: read_variable_stats(date=date)
+        )
+    elif mode == "climatology":
+        stats = get_climatology(resolution)
+    else:
+        raise ValueError("Invalid colour scale mode")
+
+    if variable not in stats.index or stats.loc[variable, ["p02", "p98"]].isna().any():
+        return None
+    return float(stats.loc[variable, "p02"]), float(stats.loc[variable, "p98"])
+
+
+def read_town_series(town_id) -> pd.DataFrame:
+    """
+    Read the full time series of every ERA5 variable and NDVI for a town,
+    indexed by date. The value cube holds each series in one block. Without
+    it, on Postgres, both queries are range reads on the (town_id, date)
+    covering indexes
+    """
+    cube = get_value_cube()
+    series = cube.town_series(town_id) if cube is not None else None
+    if series is not None:
+        return series
+
+    series = [
+        get_backend().read_frame(
+            f"select_{source}_town_series.sql",
+            params={"town_id": town_id},
+            index_col="date",
+        )
+        for source in source_variables
+    ]
+    return pd.concat(series, axis=1)
+
+
+def fetch_town_series(town_id) -> pd.DataFrame:
+    """
+    Cached version of read_town_series
+    """
+    town_id = int(town_id)
+    series_cache.validate(get_data_version())
+    return series_cache.get_or_compute(
+        town_id, lambda: read_town_series(town_id=town_id)
+    )
@@ -0,0 +1,205 @@
+import io
+
+from flask import Response, abort, request
+
+from definitions import (
+    EXPORT_CHUNK_ROWS,
+    aggregation_levels,
+    variable_sources,
+)
+from utils import read_sql_query
+
+export_formats = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class StreamSink(io.RawIOBase):
+    """
+    Write-only file that hands out what was written to it since the last
+    drain. It keeps counting bytes across drains, since the Parquet writer
+    records row group offsets from tell()
+    """
+
+    def __init__(self) -> None:
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_schema(variables: list[str], level: str):
+    """
+    Return the Arrow schema of an export: date, location id and name, and one
+    column per variable
+    """
+    import pyarrow as pa
+
+    prefix = "town" if level == "town" else "area"
+    return pa.schema(
+        [
+            ("date", pa.date32()),
+            (f"{prefix}_id", pa.int64()),
+            (f"{prefix}_name", pa.string()),
+        ]
+        + [(variable, pa.float64()) for variable in variables]
+    )
+
+
+def export_batches(variables, start_date, end_date, level, ids, areas=None):
+    """
+    Yield the requested measurements as Arrow record batches of at most
+    EXPORT_CHUNK_ROWS rows. Rows are read through a server-side cursor, so
+    memory stays bounded whatever the size of the selection. When variables of
+    both sources are requested, their values are joined on location and date
+    so each one has a single row
+    """
+    import pyarrow as pa
+    from sqlalchemy import text
+
+    from app_data_fetcher import get_engine
+
+    schema = export_schema(variables, level)
+    params = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "ids": ids,
+        "areas": areas,
+    }
+    if level != "town":
+        params["level"] = level
+
+    with get_engine().connect() as connection:
+        connection = connection.execution_options(
+            stream_results=True, max_row_buffer=EXPORT_CHUNK_ROWS
+        )
+        sources = {variable_sources[variable] for variable in variables}
+        suffix = "export" if level == "town" else "area_export"
+        if len(sources) == 1:
+            query = read_sql_query(f"select_{sources.pop()}_{suffix}.sql")
+        else:
+            query = read_sql_query(f"select_{suffix}.sql")
+
+        result = connection.execute(text(query), params)
+        for rows in result.partitions(EXPORT_CHUNK_ROWS):
+            columns = dict(zip(result.keys(), zip(*rows)))
+            yield pa.record_batch(
+                [pa.array(columns[field.name], type=field.type) for field in schema],
+                schema=schema,
+            )
+
+
+def stream_csv(batches, schema):
+    """
+    Encode record batches as one CSV document, chunk by chunk
+    """
+    import pyarrow.csv as pa_csv
+
+    include_header = True
+    for batch in batches:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(
+            batch, buffer, pa_csv.WriteOptions(include_header=include_header)
+        )
+        include_header = False
+        yield buffer.getvalue()
+
+    # Empty selections still get their header
+    if include_header:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(schema.empty_table(), buffer)
+        yield buffer.getvalue()
+
+
+def stream_parquet(batches, schema):
+    """
+    Encode record batches as one Parquet file with a row group per batch,
+    handing out each row group as soon as it is written
+    """
+    import pyarrow.parquet as pq
+
+    sink = StreamSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def register_export(server):
+    @server.route("/export")
+    def export():
+        """
+        Stream measurements as CSV or Parquet, e.g.
+        /export?variables=t2m,ndvi&start=2000-01-01&end=2020-12-31&format=parquet
+
+        variables, start and end are required. level is one of town (default),
+        province or region, ids optionally restricts the export to some
+        town_ids or area_ids, areas restricts a town export to the member towns
+        of some area_ids, and format is csv (default) or parquet
+        """
+        import pandas as pd
+
+        variables = list(dict.fromkeys(request.args.get("variables", "").split(",")))
+        level = request.args.get("level", "town")
+        export_format = request.args.get("format", "csv")
+        if (
+            not all(variable in variable_sources for variable in variables)
+            or level not in aggregation_levels.values()
+            or export_format not in export_formats
+        ):
+            abort(400)
+
+        try:
+            start_date, end_date = sorted(
+                pd.to_datetime([request.args["start"], request.args["end"]])
+            )
+            ids = request.args.get("ids")
+            ids = [int(i) for i in ids.split(",")] if ids else None
+            areas = request.args.get("areas")
+            areas = [int(i) for i in areas.split(",")] if areas else None
+        except (KeyError, ValueError):
+            abort(400)
+
+        # Areas are only a filter on towns
+        if areas and level != "town":
+            abort(400)
+
+        batches = export_batches(
+            variables=variables,
+            start_date=start_date.strftime("%Y-%m-%d"),
+            end_date=end_date.strftime("%Y-%m-%d"),
+            level=level,
+            ids=ids,
+            areas=areas,
+        )
+        schema = export_schema(variables, level)
+        if export_format == "csv":
+            body = stream_csv(batches, schema)
+        else:
+            body = stream_parquet(batches, schema)
+
+        mimetype, extension = export_formats[export_format]
+        filename = (
+            f"geodashboard_{level}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{extension}"
+        )
+        return Response(
+            body,
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
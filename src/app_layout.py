@@ -1,8 +1,18 @@
 from datetime import date
+from uuid import uuid4
 
 from dash import dcc, html
 
-from app_data_fetcher import blank_figure, variables
+from definitions import (
+    ANIMATION_FRAME_MS,
+    aggregation_levels,
+    colour_scale_modes,
+    temporal_resolutions,
+    variables,
+)
+
+# Empty figure shown until the first callback of the session sends the map
+blank_figure = {"layout": {"xaxis": {"visible": False}, "yaxis": {"visible": False}}}
 
 layout = html.Div(
     children=[
@@ -34,6 +44,51 @@ layout = html.Div(
                         ),
                     ]
                 ),
+                html.Div(
+                    children=[
+                        html.Div(children="Level", className="menu-title"),
+                        dcc.Dropdown(
+                            id="level-filter",
+                            options=[
+                                {"label": label, "value": value}
+                                for label, value in aggregation_levels.items()
+                            ],
+                            value="town",
+                            clearable=False,
+                            className="dropdown",
+                        ),
+                    ]
+                ),
+                html.Div(
+                    children=[
+                        html.Div(children="Resolution", className="menu-title"),
+                        dcc.Dropdown(
+                            id="resolution-filter",
+                            options=[
+                                {"label": label, "value": value}
+                                for label, value in temporal_resolutions.items()
+                            ],
+                            value="day",
+                            clearable=False,
+                            className="dropdown",
+                        ),
+                    ]
+                ),
+                html.Div(
+                    children=[
+                        html.Div(children="Colour scale", className="menu-title"),
+                        dcc.Dropdown(
+                            id="scale-filter",
+                            options=[
+                                {"label": label, "value": value}
+                                for label, value in colour_scale_modes.items()
+                            ],
+                            value="fixed",
+                            clearable=False,
+                            className="dropdown",
+                        ),
+                    ]
+                ),
                 html.Div(
                     children=[
                         html.Div(children="Date (DD-MM-YYYY)", className="menu-title"),
@@ -47,9 +102,34 @@ layout = html.Div(
                         ),
                     ]
                 ),
+                html.Div(
+                    children=[
+                        html.Div(children="Time-lapse until", className="menu-title"),
+                        html.Div(
+                            children=[
+                                dcc.DatePickerSingle(
+                                    id="end-date-filter",
+                                    min_date_allowed=date(1950, 1, 1),
+                                    max_date_allowed=date(2024, 7, 15),
+                                    initial_visible_month=date(2020, 1, 1),
+                                    date=date(2020, 1, 31),
+                                    display_format="DD-MM-YYYY",
+                                ),
+                                html.Button(
+                                    children="▶ Play",
+                                    id="play-button",
+                                    className="play",
+                                ),
+                            ],
+                            className="time-lapse",
+                        ),
+                    ]
+                ),
             ],
             className="menu",
         ),
+        # Date of the time-lapse frame on display
+        html.Div(id="animation-date", className="animation-date"),
         dcc.Loading(
             id="loading-spinner",
             type="circle",
@@ -57,7 +137,7 @@ layout = html.Div(
             children=[
                 dcc.Graph(
                     id="graph",
-                    figure=blank_figure(),
+                    figure=blank_figure,
                     style={
                         "width": "125vh",
                         "height": "85vh",
@@ -68,6 +148,33 @@ layout = html.Div(
             ],
             fullscreen=False,
         ),
+        # Time series of the town clicked on the map
+        dcc.Loading(
+            id="town-series-spinner",
+            type="circle",
+            children=[
+                dcc.Graph(
+                    id="town-series",
+                    figure=blank_figure,
+                    style={
+                        "width": "125vh",
+                        "height": "40vh",
+                        "marginLeft": "auto",
+                        "marginRight": "auto",
+                    },
+                )
+            ],
+        ),
+        # Aggregation level and level of detail of the geometries this session
+        # received, if any
+        dcc.Store(id="geometry-key", data=None),
+        # Time-lapse: the stream interval pulls chunks of frames from the server
+        # into animation-chunk, the browser appends them to animation-frames and
+        # the clock shows one frame per tick
+        dcc.Store(id="animation-chunk", data=None),
+        dcc.Store(id="animation-frames", data=None),
+        dcc.Interval(id="animation-stream", interval=100, disabled=True),
+        dcc.Interval(id="animation-clock", interval=ANIMATION_FRAME_MS, disabled=True),
         # Data sources
         html.Div(
             children=[
@@ -106,3 +213,13 @@ layout = html.Div(
         ),
     ]
 )
+
+
+def serve_layout() -> html.Div:
+    """
+    Return the layout for a page load, with an id of its own so server-side
+    state like prefetching is kept per session
+    """
+    return html.Div(
+        children=[*layout.children, dcc.Store(id="session-id", data=str(uuid4()))]
+    )
@@ -0,0 +1,68 @@
+from flask import Response, abort, request
+
+from caching import LRUCache
+from definitions import TILE_CACHE_MAX_BYTES, variable_sources
+from utils import read_sql_query
+
+tile_queries = {
+    "era5": read_sql_query("select_era5_tile.sql"),
+    "modis": read_sql_query("select_modis_tile.sql"),
+}
+
+# Deepest zoom level served. Deeper tiles are smaller than a town at any
+# scale and would only fill the cache with distinct keys
+MAX_TILE_ZOOM = 22
+
+# Rendered tiles keyed by (source, date, z, x, y). Every tile carries all the
+# variables of its source, so switching variable on a date reuses the tiles
+tile_cache = LRUCache(max_bytes=TILE_CACHE_MAX_BYTES, sizeof=len)
+
+
+def render_tile(source: str, date: str, z: int, x: int, y: int) -> bytes:
+    """
+    Build a Mapbox Vector Tile with the towns intersecting tile (z, x, y) and
+    their measurements for a date
+    """
+    from sqlalchemy import text
+
+    from app_data_fetcher import get_engine
+
+    # Simplify to about one tile pixel (4096 pixels per tile side)
+    tolerance = 360 / (4096 * 2**z)
+    params = {"z": z, "x": x, "y": y, "date": date, "tolerance": tolerance}
+
+    with get_engine().connect() as connection:
+        tile = connection.execute(text(tile_queries[source]), params).scalar_one()
+
+    return bytes(tile) if tile is not None else b""
+
+
+def register_tiles(server):
+    @server.route("/tiles/<int:z>/<int:x>/<int:y>.pbf")
+    def get_tile(z, x, y):
+        """
+        Serve the vector tile (z, x, y) for the variable and date given as
+        query parameters, e.g. /tiles/6/31/24.pbf?variable=t2m&date=2020-01-01
+        """
+        import pandas as pd
+
+        from app_data_fetcher import get_data_version
+
+        variable = request.args.get("variable", "t2m")
+        if variable not in variable_sources or not 0 <= z <= MAX_TILE_ZOOM:
+            abort(400)
+        if not 0 <= x < 2**z or not 0 <= y < 2**z:
+            abort(400)
+
+        try:
+            date = pd.to_datetime(request.args["date"]).strftime("%Y-%m-%d")
+        except (KeyError, ValueError):
+            abort(400)
+
+        source = variable_sources[variable]
+        tile_cache.validate(get_data_version())
+        tile = tile_cache.get_or_compute(
+            (source, date, z, x, y),
+            lambda: render_tile(source=source, date=date, z=z, x=x, y=y),
+        )
+        return Response(tile, mimetype="application/vnd.mapbox-vector-tile")
@@ -0,0 +1,119 @@
+import logging
+import re
+from collections.abc import Callable
+from datetime import date
+from functools import cache
+from pathlib import Path
+
+import pandas as pd
+
+from definitions import SQL_PATH
+from utils import read_frame, read_sql_query
+
+logger = logging.getLogger(__name__)
+
+# Tables of the Parquet store, a directory of files each. Measurements are
+# split into one directory per year, the other tables are a single file
+parquet_tables = [
+    "time",
+    "towns",
+    "towns_lod",
+    "areas",
+    "areas_lod",
+    "area_towns",
+    "era5_measurements",
+    "modis_measurements",
+    "era5_area_measurements",
+    "modis_area_measurements",
+    "era5_period_measurements",
+    "modis_period_measurements",
+    "variable_stats",
+    "variable_climatology",
+    "period_climatology",
+    "data_version",
+]
+
+
+@cache
+def load_query(sql_file: str, dialect: str | None = None) -> str:
+    """
+    Read an SQL file once. A file of the same name under sql/<dialect>/
+    replaces the shared one for backends that cannot run it as is
+    """
+    if dialect is not None and (SQL_PATH / dialect / sql_file).exists():
+        return read_sql_query(f"{dialect}/{sql_file}")
+    return read_sql_query(sql_file)
+
+
+class PostgresBackend:
+    """
+    Run the dashboard queries against the TimescaleDB/PostGIS database
+    """
+
+    name = "postgres"
+
+    def __init__(self, get_engine: Callable) -> None:
+        self._get_engine = get_engine
+
+    def read_frame(
+        self, sql_file: str, params: dict | None = None, index_col: str | None = None
+    ) -> pd.DataFrame:
+        with self._get_engine().connect() as connection:
+            return read_frame(
+                connection, load_query(sql_file), params=params, index_col=index_col
+            )
+
+
+class DuckDBBackend:
+    """
+    Run the dashboard queries with an embedded DuckDB over the Parquet store
+    written by export_parquet.py. Every table of the store is a view over its
+    files, so the SQL files run unchanged unless sql/duckdb/ replaces them.
+    Views list their files on every query, so a re-exported store is picked up
+    without a restart
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path: Path) -> None:
+        import duckdb
+
+        self.path = Path(path)
+        self._connection = duckdb.connect()
+        for table in parquet_tables:
+            # Tables missing from a store exported before they existed only
+            # fail the queries that read them
+            if not any((self.path / table).glob("**/*.parquet")):
+                logger.warning(f"No {table} files in the Parquet store")
+                continue
+
+            files = self.path / table / "**" / "*.parquet"
+            self._connection.execute(
+                f"CREATE VIEW {table} AS "
+                f"SELECT * FROM read_parquet('{files}', hive_partitioning = TRUE)"
+            )
+
+    @staticmethod
+    def _bind(value):
+        # Postgres takes ISO date strings as untyped literals, while DuckDB
+        # binds them as VARCHAR and will not compare them with dates
+        if isinstance(value, str) and re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+            return date.fromisoformat(value)
+        return value
+
+    def read_frame(
+        self, sql_file: str, params: dict | None = None, index_col: str | None = None
+    ) -> pd.DataFrame:
+        # The SQL files use :name parameters and DuckDB takes $name ones
+        query = re.sub(r"(?<![:\w]):(\w+)", r"$\1", load_query(sql_file, self.name))
+        params = {name: self._bind(value) for name, value in (params or {}).items()}
+
+        # Connections are not thread-safe, but cursors of one connection are
+        # independent connections to the same database
+        with self._connection.cursor() as cursor:
+            table = cursor.execute(query, params).arrow()
+
+        df = table.to_pandas(date_as_object=False)
+        if index_col is not None:
+            df = df.set_index(index_col)
+        return df
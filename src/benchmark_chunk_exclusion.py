@@ -0,0 +1,73 @@
+import json
+import random
+import sys
+
+import numpy as np
+from sqlalchemy import text
+
+from app_data_fetcher import date_queries, get_engine
+from utils import read_frame, read_sql_query
+
+# A variable of each source, to pick the dates that have measurements
+source_probes = {"era5": "t2m", "modis": "ndvi"}
+
+
+def scanned_chunks(plan: dict) -> set[str]:
+    """
+    Return the hypertable chunks a query plan reads
+    """
+    chunks = set()
+    relation = plan.get("Relation Name", "")
+    if relation.startswith("_hyper_"):
+        chunks.add(relation)
+    for child in plan.get("Plans", []):
+        chunks |= scanned_chunks(child)
+    return chunks
+
+
+def main(n_dates: int = 20, seed: int = 0) -> dict:
+    """
+    Explain and run the per-date map query of each source for a random sample
+    of dates, recording how many chunks each one reads and how long it takes
+    """
+    results = {}
+    with get_engine().connect() as connection:
+        for source, variable in source_probes.items():
+            dates = read_frame(
+                connection,
+                read_sql_query("select_variable_dates.sql"),
+                {"variable": variable},
+            )["date"]
+            dates = dates.dt.strftime("%Y-%m-%d").to_list()
+            sample = random.Random(seed).sample(dates, k=min(n_dates, len(dates)))
+
+            # Bound parameters are inlined client-side, so the planner sees
+            # the date as a constant and can exclude chunks, as in the app
+            query = read_sql_query(date_queries[source, "town", "day"])
+            explain = text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}")
+            chunks, latencies = [], []
+            for date in sample:
+                plan = connection.execute(explain, {"date": date}).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                chunks.append(len(scanned_chunks(plan[0]["Plan"])))
+                latencies.append(plan[0]["Execution Time"])
+
+            results[source] = {
+                "dates": len(sample),
+                "max_chunks": max(chunks, default=0),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+            }
+
+    return results
+
+
+if __name__ == "__main__":
+    results = main()
+    for source, source_results in results.items():
+        for name, value in source_results.items():
+            print(f"{source} {name}: {value}")
+
+    # Fail when any per-date query reads more than one chunk
+    sys.exit(0 if all(r["max_chunks"] == 1 for r in results.values()) else 1)
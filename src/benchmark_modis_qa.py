@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from modis_qa import mask_bad_pixels
+
+
+def reference_mask(qa_bits: int) -> bool:
+    """
+    Per-pixel decoding of the VI QA word the loader used to apply to every
+    row, kept as the reference of the lookup table in tests/test_modis_qa.py
+    """
+    vi_quality = qa_bits & 0b11  # Bits 0-1
+    vi_usefulness = (qa_bits >> 2) & 0b1111  # Bits 2-5
+    aerosol_quantity = (qa_bits >> 6) & 0b11  # Bits 6-7
+    adjacent_cloud = (qa_bits >> 8) & 0b1  # Bit 8
+    mixed_clouds = (qa_bits >> 10) & 0b1  # Bit 10
+    snow_ice = (qa_bits >> 14) & 0b1  # Bit 14
+    shadow = (qa_bits >> 15) & 0b1  # Bit 15
+
+    if vi_quality in [0b10, 0b11]:  # Cloudy or not produced
+        return True
+    if vi_usefulness >= 0b1100:  # Low quality or not useful
+        return True
+    if aerosol_quantity == 0b11:  # High aerosol quantity
+        return True
+    if adjacent_cloud == 1:  # Adjacent cloud detected
+        return True
+    if mixed_clouds == 1:  # Mixed clouds detected
+        return True
+    if snow_ice == 1:  # Snow/ice detected
+        return True
+    if shadow == 1:  # Shadow detected
+        return True
+    return False
+
+
+def timed(function, *args) -> tuple[float, object]:
+    """
+    Return the seconds a call takes and its result
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main(n_pixels: int = 2_000_000, seed: int = 0) -> dict:
+    """
+    Time the per-pixel decoding and the lookup table on a random composite of
+    n_pixels, with missing values as xarray decodes them
+    """
+    rng = np.random.default_rng(seed)
+    qa = rng.integers(0, 2**16, size=n_pixels).astype(float)
+    qa[rng.random(n_pixels) < 0.1] = np.nan
+
+    series = pd.Series(qa).dropna().astype(int)
+    apply_seconds, _ = timed(series.apply, reference_mask)
+    lookup_seconds, _ = timed(mask_bad_pixels, qa)
+
+    return {
+        "pixels": n_pixels,
+        "apply_s": round(apply_seconds, 3),
+        "lookup_s": round(lookup_seconds, 4),
+        "speedup": round(apply_seconds / lookup_seconds),
+    }
+
+
+if __name__ == "__main__":
+    results = main()
+    for name, value in results.items():
+        print(f"{name}: {value}")
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+PORT = 8051
+SERVE_APP = f"from app import create_app; create_app().run(port={PORT}, debug=False)"
+
+
+def wait_for(url: str, timeout: float) -> None:
+    """
+    Poll url until it answers with HTTP 200
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                if response.status == 200:
+                    return
+        except (URLError, ConnectionError):
+            time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer within {timeout} s")
+
+
+def main(timeout: float = 60) -> dict:
+    """
+    Start the dashboard in a fresh process and record the time until it answers
+    its health check and until it serves the page layout
+    """
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVE_APP], cwd=Path(__file__).parent
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{PORT}/health", timeout)
+        first_response = time.perf_counter() - start
+        wait_for(f"http://127.0.0.1:{PORT}/_dash-layout", timeout)
+        first_page = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "time_to_first_response_s": round(first_response, 3),
+        "time_to_first_page_s": round(first_page, 3),
+    }
+
+
+if __name__ == "__main__":
+    for name, value in main().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,44 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+from app_data_fetcher import load_towns, read_town_series
+
+# Latency target for reading the full series of a town
+TARGET_MS = 100
+
+
+def main(n_towns: int = 50, seed: int = 0) -> dict:
+    """
+    Time uncached full-series reads for a random sample of towns
+    """
+    town_ids = load_towns().index.to_list()
+    sample = random.Random(seed).sample(town_ids, k=min(n_towns, len(town_ids)))
+
+    # Warm the connection pool
+    read_town_series(town_id=sample[0])
+
+    latencies = []
+    for town_id in sample:
+        start = time.perf_counter()
+        read_town_series(town_id=town_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "towns": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "max_ms": round(max(latencies), 1),
+        "target_ms": TARGET_MS,
+    }
+
+
+if __name__ == "__main__":
+    results = main()
+    for name, value in results.items():
+        print(f"{name}: {value}")
+
+    # Fail when the 95th percentile misses the target
+    sys.exit(0 if results["p95_ms"] <= TARGET_MS else 1)
@@ -0,0 +1,215 @@
+import io
+import logging
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+from psycopg2 import sql
+from sqlalchemy import text
+
+from definitions import BULK_LOAD_CHUNK_ROWS, BULK_LOAD_STAGING
+from utils import read_sql_query
+
+logger = logging.getLogger(__name__)
+
+# Framing of the binary COPY format: signature, flags and header extension
+# length, and the field count that ends the stream
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+# Bytes handed to the server per read of the COPY stream
+COPY_READ_BYTES = 1024**2
+
+# Big-endian wire format of the fixed-width column types
+fixed_width_types = {
+    "smallint": ">i2",
+    "integer": ">i4",
+    "bigint": ">i8",
+    "real": ">f4",
+    "double precision": ">f8",
+    "boolean": "?",
+}
+
+# Dates are sent as days since this one
+POSTGRES_EPOCH = np.datetime64("2000-01-01", "D")
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read-only file over an iterator of byte blocks, so COPY can pull rows as
+    they are encoded instead of from one buffer holding the whole table
+    """
+
+    def __init__(self, chunks) -> None:
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def encode_column(values: pd.Series, data_type: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encode a column in the binary COPY format of a Postgres type. Return the
+    length of every field, -1 for NULL, and the bytes of the non-NULL fields
+    one after another
+    """
+    null = values.isna().to_numpy()
+    present = values[~null]
+
+    if data_type in fixed_width_types:
+        dtype = np.dtype(fixed_width_types[data_type])
+        data = present.to_numpy().astype(dtype)
+        lengths = np.where(null, -1, dtype.itemsize)
+        return lengths, data.view(np.uint8)
+
+    if data_type == "date":
+        days = pd.to_datetime(present).to_numpy().astype("datetime64[D]")
+        data = (days - POSTGRES_EPOCH).astype(">i4")
+        return np.where(null, -1, 4), data.view(np.uint8)
+
+    if data_type == "text" or data_type.startswith("character varying"):
+        fields = [str(value).encode() for value in present]
+    elif data_type.startswith("geometry"):
+        # PostGIS reads geometries as EWKB, with the SRID of the column
+        geometries = np.asarray(present, dtype=object)
+        srid = data_type.rstrip(")").split(",")[-1]
+        if srid.isdigit():
+            geometries = shapely.set_srid(geometries, int(srid))
+        fields = list(shapely.to_wkb(geometries, include_srid=True))
+    else:
+        raise ValueError(f"Cannot bulk load columns of type {data_type}")
+
+    lengths = np.full(len(values), -1)
+    lengths[~null] = [len(field) for field in fields]
+    return lengths, np.frombuffer(b"".join(fields), dtype=np.uint8)
+
+
+def encode_rows(df: pd.DataFrame, data_types: list[str]) -> bytes:
+    """
+    Encode the rows of a DataFrame as tuples of the binary COPY format. Fields
+    are scattered into one buffer a column at a time, without a Python loop
+    over rows
+    """
+    columns = [
+        encode_column(df[column], data_type)
+        for column, data_type in zip(df.columns, data_types)
+    ]
+
+    # Each row is its field count, then each field as its length and bytes
+    row_sizes = 2 + sum(4 + np.maximum(lengths, 0) for lengths, _ in columns)
+    positions = np.concatenate([[0], np.cumsum(row_sizes)[:-1]])
+    buffer = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+
+    field_count = np.frombuffer(struct.pack(">h", len(columns)), dtype=np.uint8)
+    buffer[positions[:, None] + np.arange(2)] = field_count
+    positions = positions + 2
+
+    for lengths, data in columns:
+        length_bytes = lengths.astype(">i4").view(np.uint8).reshape(-1, 4)
+        buffer[positions[:, None] + np.arange(4)] = length_bytes
+
+        present = lengths >= 0
+        starts = positions[present] + 4
+        sizes = lengths[present]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        buffer[np.repeat(starts - offsets, sizes) + np.arange(sizes.sum())] = data
+
+        positions = positions + 4 + np.maximum(lengths, 0)
+
+    return buffer.tobytes()
+
+
+def encode_frame(df: pd.DataFrame, data_types: list[str]):
+    """
+    Yield a DataFrame as a binary COPY stream, BULK_LOAD_CHUNK_ROWS rows at a
+    time
+    """
+    yield COPY_HEADER
+    for start in range(0, len(df), BULK_LOAD_CHUNK_ROWS):
+        yield encode_rows(df.iloc[start : start + BULK_LOAD_CHUNK_ROWS], data_types)
+    yield COPY_TRAILER
+
+
+def read_column_types(connection, table: str) -> dict[str, str]:
+    """
+    Return the Postgres type of every column of a table, by column name
+    """
+    select_table_columns = read_sql_query("select_table_columns.sql")
+    rows = connection.execute(text(select_table_columns), {"table": table})
+    return {column: data_type for column, data_type in rows}
+
+
+def compose_query(sql_file: str, **identifiers) -> sql.Composed:
+    """
+    Read an SQL file whose table and column names are placeholders, and fill
+    them with identifiers quoted by psycopg2 rather than pasted as text
+    """
+    return sql.SQL(read_sql_query(sql_file)).format(**identifiers)
+
+
+def copy_frame(connection, df: pd.DataFrame, table: str, staging=None) -> int:
+    """
+    Load the rows of a DataFrame into a table with binary COPY and return how
+    many were loaded. Columns of the frame that the table does not have are
+    ignored, like extra parameters of an INSERT. With staging, rows are first
+    copied into a temporary table, which is never WAL-logged, and moved into
+    the target with one INSERT ... SELECT. Deferrable foreign keys are checked
+    at commit, which is left to the caller
+    """
+    if staging is None:
+        staging = BULK_LOAD_STAGING
+
+    column_types = read_column_types(connection, table)
+    columns = [column for column in df.columns if column in column_types]
+    identifiers = {
+        "table": sql.Identifier(table),
+        "staging": sql.Identifier(f"staging_{table}"),
+        "columns": sql.SQL(", ").join(map(sql.Identifier, columns)),
+    }
+
+    start = time.perf_counter()
+    connection.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+    stream = ChunkStream(
+        encode_frame(df[columns], [column_types[column] for column in columns])
+    )
+    with connection.connection.cursor() as cursor:
+        if staging:
+            cursor.execute(compose_query("create_staging_table.sql", **identifiers))
+            target = identifiers["staging"]
+        else:
+            target = identifiers["table"]
+
+        cursor.copy_expert(
+            compose_query(
+                "copy_binary_to_table.sql", table=target, columns=identifiers["columns"]
+            ),
+            stream,
+            size=COPY_READ_BYTES,
+        )
+
+        if staging:
+            cursor.execute(
+                compose_query("insert_from_staging_table.sql", **identifiers)
+            )
+            cursor.execute(compose_query("drop_staging_table.sql", **identifiers))
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Loaded {len(df):,} rows into {table} in {elapsed:.2f} s "
+        f"({len(df) / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
+    return len(df)
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+# Temporary files of the disk cache older than this were left by a writer that
+# died before renaming them into place
+STALE_WRITE_SECONDS = 15 * 60
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache bounded by the approximate size in
+    bytes of its entries. Entries are tagged with a data version: validating the
+    cache against a new version drops every entry.
+    """
+
+    def __init__(
+        self, max_bytes: int, sizeof: Callable[[Any], int] = sys.getsizeof
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, marking it as most recently used
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store value under key, evicting least recently used entries until the
+        cache fits in its memory budget. Values larger than the whole budget
+        are not cached
+        """
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def validate(self, version: Any) -> None:
+        """
+        Drop every entry if they were computed for a different data version
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._size = 0
+                self.version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "version": self.version,
+        }
+
+
+class DiskCache:
+    """
+    Cache shared by every process on the host, stored as pickle files in one
+    directory per data version. Entries are written to a temporary file and
+    renamed into place, so concurrent readers never see a partial entry. When
+    the cache grows past its budget, the least recently written entries are
+    removed.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = Lock()
+
+    def _path(self, key: Hashable, version: Any) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.directory / f"v{version}" / f"{digest}.pkl"
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable, version: Any, default: Any = None) -> Any:
+        path = self._path(key, version)
+        try:
+            with path.open("rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return default
+        except (
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            ImportError,
+            IndexError,
+            TypeError,
+            ValueError,
+        ):
+            # Entries truncated by a full disk or pickled by another version
+            # of the code are dropped, so they are computed and written again
+            path.unlink(missing_ok=True)
+            self._count(hit=False)
+            return default
+        self._count(hit=True)
+        return value
+
+    def put(self, key: Hashable, version: Any, value: Any) -> None:
+        """
+        Store value under key. The value is not cached when the file cannot be
+        written, e.g. when a worker that already saw a newer data version
+        removed the directory of this one
+        """
+        path = self._path(key, version)
+        staging = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+                staging = Path(f.name)
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(staging, path)
+            staging = None
+        except OSError:
+            return
+        finally:
+            if staging is not None:
+                staging.unlink(missing_ok=True)
+
+        # Scanning the directory is not free, so only prune every few writes
+        with self._lock:
+            self._writes += 1
+            writes = self._writes
+        if writes % 64 == 1:
+            self.prune(version)
+
+    def get_or_compute(
+        self, key: Hashable, version: Any, compute: Callable[[], Any]
+    ) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss
+        """
+        sentinel = object()
+        value = self.get(key, version, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, version, value)
+        return value
+
+    def prune(self, version: int) -> None:
+        """
+        Remove the entries of older data versions, temporary files left by
+        writers that died, and, if the current entries do not fit in the
+        budget, the oldest of them. Workers see a new data version at different
+        times, so newer versions than the caller's are left alone
+        """
+        for directory in self.directory.glob("v*"):
+            try:
+                directory_version = int(directory.name[1:])
+            except ValueError:
+                continue
+            if directory_version < version:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        current = self.directory / f"v{version}"
+        entries = []
+        for path in current.glob("*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.suffix == ".pkl":
+                entries.append((stat.st_mtime, stat.st_size, path))
+            elif time.time() - stat.st_mtime > STALE_WRITE_SECONDS:
+                path.unlink(missing_ok=True)
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "directory": str(self.directory),
+                "max_bytes": self.max_bytes,
+            }
@@ -1,15 +1,37 @@
+import logging
+from functools import partial
 from multiprocessing import Pool, cpu_count
 from pathlib import Path
 
-import geopandas as gpd
+import pandas as pd
 import rioxarray
 import xarray as xr
-from shapely import box
 from sqlalchemy import create_engine, text
 from tqdm import tqdm
 
-from definitions import DATA_PATH, DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
-from utils import read_sql_query
+from bulk_load import copy_frame
+from definitions import (
+    COMPRESS_AFTER,
+    CUBE_PATH,
+    DATA_BACKEND,
+    DATA_PATH,
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    source_variables,
+)
+from export_parquet import export_store
+from ingestion_manifest import (
+    file_checksum,
+    read_manifest,
+    read_unpublished_years,
+    record_loaded_file,
+)
+from pixel_weights import PixelWeights, load_pixel_weights
+from utils import bump_data_version, read_frame, read_sql_query, refresh_climatology
+from value_cube import export_value_cube
 
 
 def create_table() -> None:
@@ -34,124 +56,242 @@ def create_table() -> None:
     )
     connection.execute(text(create_measurements_hypertable))
     connection.commit()
+
+    # Columnar compression of historical chunks, applied by compress_measurements
+    enable_compression = read_sql_query("enable_era5_measurements_compression.sql")
+    connection.execute(text(enable_compression))
+    connection.commit()
+
+    # Province and region aggregates, filled as each file is inserted
+    create_area_measurements_table = read_sql_query(
+        "create_era5_area_measurements_table.sql"
+    )
+    connection.execute(text(create_area_measurements_table))
+    connection.commit()
+
+    # Source files already loaded, so reruns skip them
+    create_ingestion_manifest_table = read_sql_query(
+        "create_ingestion_manifest_table.sql"
+    )
+    connection.execute(text(create_ingestion_manifest_table))
+    connection.commit()
+
+    # Per-date statistics of every variable, filled as each file is inserted
+    create_variable_stats_tables = read_sql_query("create_variable_stats_tables.sql")
+    connection.execute(text(create_variable_stats_tables))
+    connection.commit()
+
+    # Monthly, seasonal and annual rollups, refreshed after each file
+    create_period_start_function = read_sql_query("create_period_start_function.sql")
+    connection.execute(text(create_period_start_function))
+    create_period_measurements_table = read_sql_query(
+        "create_era5_period_measurements_table.sql"
+    )
+    connection.execute(text(create_period_measurements_table))
+    connection.commit()
     connection.close()
 
 
-def insert_data(anomaly_file: str | Path) -> None:
+def read_pixel_weights(anomaly_ds: xr.Dataset) -> PixelWeights:
     """
-    Connect to the database and insert measurements data into it
+    Return the town weights of the 0.1° pixels of an ERA5 file, computed on
+    first use
     """
+    return load_pixel_weights(
+        "era5",
+        anomaly_ds["longitude"].values,
+        anomaly_ds["latitude"].values,
+        half_size=0.05,
+    )
+
+
+def insert_data(anomaly_file: str | Path, manifest: dict[str, str]) -> dict | None:
+    """
+    Connect to the database and insert measurements data into it, replacing
+    the measurements of the dates of the file. Return the manifest entry of
+    the file, or None when the manifest has it with the same checksum
+    """
+    checksum = file_checksum(anomaly_file)
+    if manifest.get(Path(anomaly_file).name) == checksum:
+        return None
     engine = create_engine(
         f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
     connection = engine.connect()
 
-    towns = gpd.read_parquet(DATA_PATH / "shapefiles" / "towns_v2.parquet")
-    towns = towns.to_crs(epsg=4326)
-
     anomaly_ds = xr.open_dataset(anomaly_file)
     start_date = str(anomaly_ds.time.dt.date.min().values)
     end_date = str(anomaly_ds.time.dt.date.max().values)
 
-    df = anomaly_ds.to_dataframe().reset_index()
-    anomaly_ds.close()
-    df.dropna(inplace=True)
-    df = df.reset_index()
-
-    # Regenerate pixel polygons from pixel centroids
-    offset_value = 0.05
-    xmin = df["longitude"] - offset_value
-    xmax = df["longitude"] + offset_value
-    ymin = df["latitude"] - offset_value
-    ymax = df["latitude"] + offset_value
-    polygons = box(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax)
-
-    gdf = gpd.GeoDataFrame(
-        df,
-        geometry=polygons,
-        crs="EPSG:4326",
+    # Area-weighted mean of the pixels overlapping each town, one sparse
+    # product per variable over the whole file
+    weights = read_pixel_weights(anomaly_ds)
+    index = pd.MultiIndex.from_product(
+        [anomaly_ds.indexes["time"], weights.towns], names=["time", "town_name"]
     )
-
-    gdf["tp"] = gdf["tp"] * 1000  # ERA5 has precipitation in m -> convert to mm
-
-    # So the thing is that by doing this with predicate None, we are performing the
-    # spatial join with the bboxes of the objetcs, rather than with the objetcs
-    # themselves. Given that results are almost the same (delta ~ 0.0001), we use
-    # this method since it is WAY FASTER than using 'intersect' as predicate.
-    # See: https://github.com/geopandas/geopandas/discussions/3063
-    joined_gdf = gpd.sjoin(gdf, towns, how="inner", predicate=None)
-    joined_gdf = joined_gdf.drop(
-        columns=[
-            "longitude",
-            "latitude",
-            "spatial_ref",
-            "geometry",
-            "lai_hv",
-            "lai_lv",
-            "index_right",
-            "index",
-        ]
+    town_values = pd.DataFrame(
+        {
+            variable: weights.aggregate(
+                anomaly_ds[variable].transpose("time", "latitude", "longitude").values
+            ).ravel()
+            for variable in source_variables["era5"]
+        },
+        index=index,
     )
+    anomaly_ds.close()
+    town_values = town_values.dropna(how="all")
 
-    joined_gdf = joined_gdf.groupby(["time", "town_name"]).mean(numeric_only=True)
-
-    for col in joined_gdf:
-        joined_gdf[col] = joined_gdf[col].apply(lambda x: round(x, 2))
+    town_values["tp"] = town_values["tp"] * 1000  # ERA5 has precipitation in m -> mm
+    town_values = town_values.round(2)
 
     # Define queries to get town_id and time_id
     town_query = read_sql_query("select_towns.sql")
     time_query = read_sql_query("select_dates.sql")
     dates = {"start_date": start_date, "end_date": end_date}
 
-    result_town = connection.execute(text(town_query)).mappings().all()
-    result_times = connection.execute(text(time_query), dates).mappings().all()
+    # Read them as columns: {'town_name': town_id} and {'date': time_id}
+    town_ids = read_frame(connection, town_query, index_col="town_name")["town_id"]
+    time_ids = read_frame(connection, time_query, dates, index_col="date")["time_id"]
 
-    # Convert result_town into a dictionary: {'town_name': town_id}
-    town_dict = {row["town_name"]: row["town_id"] for row in result_town}
+    # Add town_id and time_id from the database to the town_values
+    # to efficiently insert into the 'era6_measurements' table. The date is
+    # stored too, since the hypertable is partitioned on it
+    town_values["town_id"] = town_values.index.get_level_values("town_name").map(
+        town_ids
+    )
+    town_values["time_id"] = town_values.index.get_level_values("time").map(time_ids)
+    town_values["date"] = town_values.index.get_level_values("time").date
+
+    # Replace the dates of the file in one transaction, so a rerun after a
+    # crash or of a changed file never duplicates them
+    delete_measurements = read_sql_query("delete_era5_measurements.sql")
+    connection.execute(text(delete_measurements), dates)
+    row_count = copy_frame(connection, town_values, "era5_measurements")
+    connection.commit()
 
-    # Convert result_times into a dictionary: {'date': time_id}
-    time_dict = {row["date"]: row["time_id"] for row in result_times}
+    # Roll the dates of the file up into provinces and regions
+    refresh_area_measurements = read_sql_query("refresh_era5_area_measurements.sql")
+    connection.execute(text(refresh_area_measurements), dates)
+    connection.commit()
 
-    # Add town_id and time_id from the database to the joined_gdf
-    # to efficiently insert into the 'era6_measurements' table
-    joined_gdf["town_id"] = joined_gdf.index.get_level_values("town_name").map(
-        town_dict
-    )
-    joined_gdf["time_id"] = joined_gdf.index.get_level_values("time").map(time_dict)
+    # Colour-scale statistics of the dates of the file
+    refresh_variable_stats = read_sql_query("refresh_era5_variable_stats.sql")
+    connection.execute(text(refresh_variable_stats), dates)
+    connection.commit()
+
+    connection.close()
+
+    return {
+        "source": "era5",
+        "file_name": Path(anomaly_file).name,
+        "checksum": checksum,
+        "row_count": row_count,
+        **dates,
+    }
 
-    values = joined_gdf.to_dict(orient="records")
 
-    insert_to_measurements = read_sql_query("insert_to_era5_measurements.sql")
+def create_index() -> None:
+    """
+    Connect to the database and create a unique (town_id, date) index covering
+    every measurement in 'era5_measurements' table, so per-town series are read
+    from the index alone, and a (date, town_id) index for per-date reads
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
 
-    connection.execute(text(insert_to_measurements), values)
+    connection = engine.connect()
+    create_town_time_index = read_sql_query("create_town_time_index_era5.sql")
+    connection.execute(text(create_town_time_index))
     connection.commit()
 
+    create_date_town_index = read_sql_query("create_date_town_index_era5.sql")
+    connection.execute(text(create_date_town_index))
+    connection.commit()
     connection.close()
 
 
-def create_index() -> None:
+def compress_measurements() -> None:
     """
-    Connect to the database and create an index for town_id in 'era5_measurements' table
+    Connect to the database, compress the 'era5_measurements' chunks older than
+    COMPRESS_AFTER and schedule the policy that compresses newer ones as they age
     """
     engine = create_engine(
         f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
     connection = engine.connect()
-    create_town_id_index = read_sql_query("create_town_id_index_era5.sql")
-    connection.execute(text(create_town_id_index))
+    compress_chunks = read_sql_query("compress_era5_measurements.sql")
+    connection.execute(text(compress_chunks), {"compress_after": COMPRESS_AFTER})
+    connection.commit()
+    connection.close()
+
+
+def refresh_period_measurements(start_date: str, end_date: str) -> None:
+    """
+    Connect to the database and recompute the monthly, seasonal and annual
+    values of the periods overlapping a date range. Periods are shared between
+    files, so this runs in the main process, one file at a time
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+    refresh_periods = read_sql_query("refresh_era5_period_measurements.sql")
+    connection.execute(
+        text(refresh_periods),
+        {"start_date": start_date, "end_date": end_date},
+    )
     connection.commit()
     connection.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(processName)s - %(asctime)s - [%(levelname)s]: %(message)s",
+        level=logging.INFO,
+    )
     create_table()
     files = sorted((DATA_PATH / "anomaly_all").glob("*.nc"))
 
+    # Compute the pixel weights once, before the workers need them
+    with xr.open_dataset(files[0]) as anomaly_ds:
+        read_pixel_weights(anomaly_ds)
+
+    # Files in the manifest with the same checksum are skipped. Each one is
+    # recorded once its periods are refreshed, so a crash before that loads
+    # it again on the next run
+    insert_file = partial(insert_data, manifest=read_manifest("era5"))
     with Pool(processes=cpu_count()) as pool, tqdm(total=len(files)) as pbar:
-        for result in pool.imap(insert_data, files):
+        for loaded_file in pool.imap(insert_file, files):
+            if loaded_file is not None:
+                refresh_period_measurements(
+                    start_date=loaded_file["start_date"],
+                    end_date=loaded_file["end_date"],
+                )
+                record_loaded_file(loaded_file)
             pbar.update()
             pbar.refresh()
 
-    create_index()
+    # A rerun without new files leaves the dashboard data, and its caches,
+    # untouched. Files loaded by a run that crashed before publishing them
+    # are still picked up
+    years = read_unpublished_years()
+    if not years:
+        logging.info("No new files loaded, the data version is unchanged")
+    else:
+        create_index()
+        compress_measurements()
+        refresh_climatology()
+        bump_data_version()
+
+        # Rewrite the years of the Parquet store read by the DuckDB backend
+        # that the new files cover
+        if DATA_BACKEND == "duckdb":
+            export_store(years=years)
+
+        # Rewrite the value cube, if one is in use, for the new data version
+        if CUBE_PATH.exists():
+            export_value_cube(years=years)
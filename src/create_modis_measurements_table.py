@@ -1,49 +1,50 @@
+import logging
+from functools import partial
+from multiprocessing import Pool, cpu_count
 from pathlib import Path
 
-import geopandas as gpd
+import numpy as np
+import pandas as pd
 import rioxarray
 import xarray as xr
-from shapely import box
 from sqlalchemy import create_engine, text
 from tqdm import tqdm
 
-from definitions import DATA_PATH, DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
-from utils import read_sql_query
-
-
-def mask_bad_pixels(qa_bits: int) -> bool:
-    """
-    Given the MODIS VI QA value, return False if pixel is ok and True if pixel
-    should be masked. See: https://lpdaac.usgs.gov/documents/103/MOD13_User_Guide_V6.pdf
-    table 5, page 16.
-    """
-    # Extract bits for each relevant category.
-    vi_quality = qa_bits & 0b11  # Bits 0-1
-    vi_usefulness = (qa_bits >> 2) & 0b1111  # Bits 2-5
-    aerosol_quantity = (qa_bits >> 6) & 0b11  # Bits 6-7
-    adjacent_cloud = (qa_bits >> 8) & 0b1  # Bit 8
-    mixed_clouds = (qa_bits >> 10) & 0b1  # Bit 10
-    snow_ice = (qa_bits >> 14) & 0b1  # Bit 14
-    shadow = (qa_bits >> 15) & 0b1  # Bit 15
-
-    # Mask conditions
-    if vi_quality in [0b10, 0b11]:  # Cloudy or not produced
-        return True
-    if vi_usefulness >= 0b1100:  # Low quality or not useful
-        return True
-    if aerosol_quantity == 0b11:  # High aerosol quantity
-        return True
-    if adjacent_cloud == 1:  # Adjacent cloud detected
-        return True
-    if mixed_clouds == 1:  # Mixed clouds detected
-        return True
-    if snow_ice == 1:  # Snow/ice detected
-        return True
-    if shadow == 1:  # Shadow detected
-        return True
-
-    # If no conditions met, pixel is good
-    return False
+from bulk_load import copy_frame
+from definitions import (
+    COMPRESS_AFTER,
+    CUBE_PATH,
+    DATA_BACKEND,
+    DATA_PATH,
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    MODIS_MEMORY_LIMIT_MB,
+    MODIS_TILE_ROWS,
+)
+from export_parquet import export_store
+from ingestion_manifest import (
+    file_checksum,
+    read_manifest,
+    read_unpublished_years,
+    record_loaded_file,
+)
+from modis_qa import mask_bad_pixels
+from pixel_weights import PixelWeights, load_pixel_weights
+from utils import bump_data_version, read_frame, read_sql_query, refresh_climatology
+from value_cube import export_value_cube
+
+logger = logging.getLogger(__name__)
+
+# Memory of an insert process besides its band of pixels: the interpreter,
+# its libraries and a database connection
+PROCESS_BASE_BYTES = 256 * 1024**2
+
+# Memory of a pixel of a band while it is masked and reduced: the NDVI and QA
+# values, the mask and the float64 copies taken by the sparse products
+TILE_PIXEL_BYTES = 64
 
 
 def create_table() -> None:
@@ -68,13 +69,81 @@ def create_table() -> None:
     )
     connection.execute(text(create_measurements_hypertable))
     connection.commit()
+
+    # Columnar compression of historical chunks, applied by compress_measurements
+    enable_compression = read_sql_query("enable_modis_measurements_compression.sql")
+    connection.execute(text(enable_compression))
+    connection.commit()
+
+    # Province and region aggregates, filled as each file is inserted
+    create_area_measurements_table = read_sql_query(
+        "create_modis_area_measurements_table.sql"
+    )
+    connection.execute(text(create_area_measurements_table))
+    connection.commit()
+
+    # Source files already loaded, so reruns skip them
+    create_ingestion_manifest_table = read_sql_query(
+        "create_ingestion_manifest_table.sql"
+    )
+    connection.execute(text(create_ingestion_manifest_table))
+    connection.commit()
+
+    # Per-date statistics of every variable, filled as each file is inserted
+    create_variable_stats_tables = read_sql_query("create_variable_stats_tables.sql")
+    connection.execute(text(create_variable_stats_tables))
+    connection.commit()
+
+    # Monthly, seasonal and annual rollups, refreshed after each file
+    create_period_start_function = read_sql_query("create_period_start_function.sql")
+    connection.execute(text(create_period_start_function))
+    create_period_measurements_table = read_sql_query(
+        "create_modis_period_measurements_table.sql"
+    )
+    connection.execute(text(create_period_measurements_table))
+    connection.commit()
     connection.close()
 
 
-def insert_data(modis_file: str | Path) -> None:
+def read_pixel_weights(modis_ds: xr.Dataset) -> PixelWeights:
     """
-    Connect to the database and insert measurements data into it
+    Return the town weights of the 250 m pixels of a MODIS file, computed on
+    first use
     """
+    return load_pixel_weights(
+        "modis",
+        modis_ds["lon"].values,
+        modis_ds["lat"].values,
+        half_size=0.002083333333 / 2,
+    )
+
+
+def plan_processes(weights: PixelWeights, n_lon: int) -> int:
+    """
+    Return how many composites to insert at once: one per core, as long as
+    the pixel weights and a band of rows per process stay under
+    MODIS_MEMORY_LIMIT_MB
+    """
+    process_bytes = PROCESS_BASE_BYTES + MODIS_TILE_ROWS * n_lon * TILE_PIXEL_BYTES
+    available = MODIS_MEMORY_LIMIT_MB * 1024**2 - weights.nbytes
+    processes = min(cpu_count(), available // process_bytes)
+    if processes < 1:
+        logger.warning(
+            f"MODIS_MEMORY_LIMIT_MB={MODIS_MEMORY_LIMIT_MB} does not fit a single "
+            "process, lower MODIS_TILE_ROWS. Inserting one composite at a time"
+        )
+    return max(processes, 1)
+
+
+def insert_data(modis_file: str | Path, manifest: dict[str, str]) -> dict | None:
+    """
+    Connect to the database and insert measurements data into it, replacing
+    the measurements of the dates of the file. Return the manifest entry of
+    the file, or None when the manifest has it with the same checksum
+    """
+    checksum = file_checksum(modis_file)
+    if manifest.get(Path(modis_file).name) == checksum:
+        return None
 
     engine = create_engine(
         f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
@@ -82,113 +151,187 @@ def insert_data(modis_file: str | Path) -> None:
 
     connection = engine.connect()
 
-    towns = gpd.read_parquet(DATA_PATH / "shapefiles" / "towns_v2.parquet")
-    towns = towns.to_crs(epsg=4326)
-
+    # Only the coordinates are converted, so the data stays on disk until
+    # each band is read
     modis_ds = xr.open_dataset(modis_file)
-    modis_ds = modis_ds.convert_calendar(calendar="gregorian")
-    date = modis_ds.indexes["time"].strftime("%Y-%m-%d")[0]
-
-    df = modis_ds.to_dataframe().reset_index()
+    times = modis_ds["time"].convert_calendar(calendar="gregorian").indexes["time"]
+    date = times.strftime("%Y-%m-%d")[0]
+    weights = read_pixel_weights(modis_ds)
+
+    # Area-weighted mean of the pixels overlapping each town, summed over
+    # bands of MODIS_TILE_ROWS rows so a composite is never in memory at once
+    totals = np.zeros(len(weights.towns))
+    valid_weights = np.zeros(len(weights.towns))
+    for start_row in range(0, modis_ds.sizes["lat"], MODIS_TILE_ROWS):
+        tile = modis_ds.isel(time=0, lat=slice(start_row, start_row + MODIS_TILE_ROWS))
+        ndvi = tile["_250m_16_days_NDVI"].transpose("lat", "lon").values
+        qa = tile["_250m_16_days_VI_Quality"].transpose("lat", "lon").values
+
+        # Leave pixels without a QA value or flagged by it out of the means
+        ndvi = np.where(mask_bad_pixels(qa), np.nan, ndvi)
+
+        tile_totals, tile_weights = weights.partial_sums(ndvi, start_row)
+        totals += tile_totals
+        valid_weights += tile_weights
     modis_ds.close()
 
-    df.dropna(inplace=True)
-    df = df.reset_index()
-    df["_250m_16_days_VI_Quality"] = df["_250m_16_days_VI_Quality"].astype(int)
-    df["_250m_16_days_VI_Quality"] = df["_250m_16_days_VI_Quality"].apply(
-        mask_bad_pixels
-    )
-
-    # Regenerate pixel polygons from pixel centroids
-    offset_value = 0.002083333333 / 2
-    xmin = df["lon"] - offset_value
-    xmax = df["lon"] + offset_value
-    ymin = df["lat"] - offset_value
-    ymax = df["lat"] + offset_value
-    polygons = box(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax)
-
-    gdf = gpd.GeoDataFrame(
-        df,
-        geometry=polygons,
-    )
-    del df
-    gdf = gdf[~gdf["_250m_16_days_VI_Quality"]]
-
-    # So the thing is that by doing this with predicate None, we are performing the
-    # spatial join with the bboxes of the objetcs, rather than with the objetcs
-    # themselves. Given that results are almost the same (delta ~ 0.0001), we use
-    # this method since it is WAY FASTER than using 'intersect' as predicate.
-    # See: https://github.com/geopandas/geopandas/discussions/3063
-    joined_gdf = gpd.sjoin(gdf, towns, how="inner", predicate=None)
-    del gdf
-    joined_gdf = joined_gdf.drop(
-        columns=[
-            "lon",
-            "lat",
-            "geometry",
-            "index_right",
-            "_250m_16_days_VI_Quality",
-            "crs",
-            "time",
-            "index",
-        ]
-    )
-
-    joined_gdf = joined_gdf.groupby(["town_name"]).mean(numeric_only=True)
+    town_values = pd.DataFrame(
+        {"ndvi": weights.means(totals, valid_weights)}, index=weights.towns
+    ).dropna()
+    town_values = town_values.round(2)
 
-    for col in joined_gdf:
-        joined_gdf[col] = joined_gdf[col].apply(lambda x: round(x, 2))
-
-    joined_gdf = joined_gdf.rename(columns={"_250m_16_days_NDVI": "ndvi"})
     # Define queries to get town_id and time_id
     town_query = read_sql_query("select_towns.sql")
     time_query = read_sql_query("select_date.sql")
     date_dict = {"date": date}
 
-    result_town = connection.execute(text(town_query)).mappings().all()
-    result_times = connection.execute(text(time_query), date_dict).mappings().all()
-
-    # Convert result_town into a dictionary: {'town_name': town_id}
-    town_dict = {row["town_name"]: row["town_id"] for row in result_town}
+    # Read the towns as a column: {'town_name': town_id}
+    town_ids = read_frame(connection, town_query, index_col="town_name")["town_id"]
+    time_ids = read_frame(connection, time_query, date_dict)["time_id"]
 
-    # Add town_id and time_id from the database to the joined_gdf
+    # Add town_id and time_id from the database to the town_values
     # to efficiently insert into the 'modis_measurements' table
-    joined_gdf["town_id"] = joined_gdf.index.get_level_values("town_name").map(
-        town_dict
-    )
-    joined_gdf["time_id"] = result_times[0]["time_id"]
-
-    values = joined_gdf.to_dict(orient="records")
+    town_values["town_id"] = town_values.index.map(town_ids)
+    town_values["time_id"] = time_ids.iloc[0]
+    town_values["date"] = date
+
+    # Replace the date of the file in one transaction, so a rerun after a
+    # crash or of a changed file never duplicates it
+    dates = {"start_date": date, "end_date": date}
+    delete_measurements = read_sql_query("delete_modis_measurements.sql")
+    connection.execute(text(delete_measurements), dates)
+    row_count = copy_frame(connection, town_values, "modis_measurements")
+    connection.commit()
 
-    insert_to_measurements = read_sql_query("insert_to_modis_measurements.sql")
+    # Roll the dates of the file up into provinces and regions
+    refresh_area_measurements = read_sql_query("refresh_modis_area_measurements.sql")
+    connection.execute(text(refresh_area_measurements), dates)
+    connection.commit()
 
-    connection.execute(text(insert_to_measurements), values)
+    # Colour-scale statistics of the date of the file
+    refresh_variable_stats = read_sql_query("refresh_modis_variable_stats.sql")
+    connection.execute(text(refresh_variable_stats), dates)
     connection.commit()
 
     connection.close()
 
+    return {
+        "source": "modis",
+        "file_name": Path(modis_file).name,
+        "checksum": checksum,
+        "row_count": row_count,
+        **dates,
+    }
+
 
 def create_index() -> None:
     """
-    Connect to the database and create an index for town_id in 'modis_measurements' table
+    Connect to the database and create a unique (town_id, date) index covering
+    every measurement in 'modis_measurements' table, so per-town series are read
+    from the index alone, and a (date, town_id) index for per-date reads
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+    create_town_time_index = read_sql_query("create_town_time_index_modis.sql")
+    connection.execute(text(create_town_time_index))
+    connection.commit()
+
+    create_date_town_index = read_sql_query("create_date_town_index_modis.sql")
+    connection.execute(text(create_date_town_index))
+    connection.commit()
+    connection.close()
+
+
+def compress_measurements() -> None:
+    """
+    Connect to the database, compress the 'modis_measurements' chunks older than
+    COMPRESS_AFTER and schedule the policy that compresses newer ones as they age
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+    compress_chunks = read_sql_query("compress_modis_measurements.sql")
+    connection.execute(text(compress_chunks), {"compress_after": COMPRESS_AFTER})
+    connection.commit()
+    connection.close()
+
+
+def refresh_period_measurements(start_date: str, end_date: str) -> None:
+    """
+    Connect to the database and recompute the monthly, seasonal and annual
+    values of the periods overlapping a date range. Periods are shared between
+    files, so this runs in the main process, one file at a time
     """
     engine = create_engine(
         f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
     connection = engine.connect()
-    create_town_id_index = read_sql_query("create_town_id_index_modis.sql")
-    connection.execute(text(create_town_id_index))
+    refresh_periods = read_sql_query("refresh_modis_period_measurements.sql")
+    connection.execute(
+        text(refresh_periods),
+        {"start_date": start_date, "end_date": end_date},
+    )
     connection.commit()
     connection.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(processName)s - %(asctime)s - [%(levelname)s]: %(message)s",
+        level=logging.INFO,
+    )
     create_table()
     files = sorted((DATA_PATH / "modis_ndvi").glob("*.nc"))
 
-    # NOTE: we cannot use multiprocessing since we do not have enough RAM
-    for file in tqdm(files, desc="Inserting MODIS NDVI data to PostgreSQL"):
-        insert_data(modis_file=file)
-
-    create_index()
+    # Compute the pixel weights once, before the workers need them. Workers
+    # are forked after, so they share this copy
+    with xr.open_dataset(files[0]) as modis_ds:
+        weights = read_pixel_weights(modis_ds)
+
+    # Composites are read a band at a time, so several of them fit in
+    # MODIS_MEMORY_LIMIT_MB at once
+    processes = plan_processes(weights, n_lon=modis_ds.sizes["lon"])
+
+    # Files in the manifest with the same checksum are skipped. Each one is
+    # recorded once its periods are refreshed, so a crash before that loads
+    # it again on the next run
+    insert_file = partial(insert_data, manifest=read_manifest("modis"))
+    with Pool(processes=processes) as pool, tqdm(
+        total=len(files), desc="Inserting MODIS NDVI data to PostgreSQL"
+    ) as pbar:
+        for loaded_file in pool.imap(insert_file, files):
+            if loaded_file is not None:
+                refresh_period_measurements(
+                    start_date=loaded_file["start_date"],
+                    end_date=loaded_file["end_date"],
+                )
+                record_loaded_file(loaded_file)
+            pbar.update()
+            pbar.refresh()
+
+    # A rerun without new files leaves the dashboard data, and its caches,
+    # untouched. Files loaded by a run that crashed before publishing them
+    # are still picked up
+    years = read_unpublished_years()
+    if not years:
+        logging.info("No new files loaded, the data version is unchanged")
+    else:
+        create_index()
+        compress_measurements()
+        refresh_climatology()
+        bump_data_version()
+
+        # Rewrite the years of the Parquet store read by the DuckDB backend
+        # that the new files cover
+        if DATA_BACKEND == "duckdb":
+            export_store(years=years)
+
+        # Rewrite the value cube, if one is in use, for the new data version
+        if CUBE_PATH.exists():
+            export_value_cube(years=years)
@@ -1,6 +1,9 @@
+import logging
+
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+from bulk_load import copy_frame
 from definitions import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
 from utils import read_sql_query
 
@@ -22,19 +25,24 @@ def main() -> None:
     connection.execute(text(create_time_table))
     connection.commit()
 
-    insert_to_time = read_sql_query("insert_to_time.sql")
+    # The dashboard reads the ingestion version stamp from this table
+    create_data_version_table = read_sql_query("create_data_version_table.sql")
+    connection.execute(text(create_data_version_table))
+    connection.commit()
 
     df = pd.DataFrame(
         data=pd.date_range("1950-01-01", "2024-07-31", freq="D"), columns=["date"]
     )
 
-    values = df.to_dict(orient="records")
-
-    connection.execute(text(insert_to_time), values)
+    copy_frame(connection, df, "time")
     connection.commit()
 
     connection.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(processName)s - %(asctime)s - [%(levelname)s]: %(message)s",
+        level=logging.INFO,
+    )
     main()
@@ -1,8 +1,24 @@
+import logging
+
 import geopandas as gpd
 from sqlalchemy import create_engine, text
 
-from definitions import DATA_PATH, DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
-from utils import read_sql_query
+from bulk_load import copy_frame
+from definitions import (
+    CUBE_PATH,
+    DATA_BACKEND,
+    DATA_PATH,
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    GEOMETRY_LODS,
+    area_levels,
+)
+from export_parquet import export_store
+from utils import bump_data_version, read_sql_query
+from value_cube import export_value_cube
 
 
 def main() -> None:
@@ -23,13 +39,9 @@ def main() -> None:
     connection.execute(text(create_towns_table))
     connection.commit()
 
-    towns["geometry"] = towns["geometry"].apply(lambda geom: geom.wkt)
-    data = towns.to_dict(orient="records")
-
-    # SQL query to insert data
-    insert_to_towns = read_sql_query("insert_to_towns.sql")
-
-    connection.execute(text(insert_to_towns), data)
+    # Geometries are sent as EWKB with the SRID of the column
+    columns = ["town_name", "province", "region", "geometry"]
+    copy_frame(connection, towns[columns], "towns")
     connection.commit()
 
     connection.close()
@@ -53,6 +65,74 @@ def create_index() -> None:
     connection.close()
 
 
+def create_lod_table() -> None:
+    """
+    Connect to the database, create the 'towns_lod' table and fill it with the
+    town geometries simplified at every level of detail used by the dashboard
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    create_towns_lod_table = read_sql_query("create_towns_lod_table.sql")
+    connection.execute(text(create_towns_lod_table))
+    connection.commit()
+
+    insert_to_towns_lod = read_sql_query("insert_to_towns_lod.sql")
+
+    for _, tolerance in GEOMETRY_LODS:
+        connection.execute(text(insert_to_towns_lod), {"tolerance": tolerance})
+        connection.commit()
+
+    connection.close()
+
+
+def create_area_tables() -> None:
+    """
+    Connect to the database, create the 'areas' table with the towns of every
+    province and region dissolved into one geometry, and the 'area_towns' table
+    with the area weight of each town in them
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    create_areas_table = read_sql_query("create_areas_table.sql")
+    connection.execute(text(create_areas_table))
+    connection.commit()
+
+    insert_to_areas = read_sql_query("insert_to_areas.sql")
+
+    for level in area_levels:
+        connection.execute(text(insert_to_areas), {"level": level})
+        connection.commit()
+
+    insert_to_area_towns = read_sql_query("insert_to_area_towns.sql")
+    connection.execute(text(insert_to_area_towns))
+    connection.commit()
+
+    connection.close()
+
+
 if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(processName)s - %(asctime)s - [%(levelname)s]: %(message)s",
+        level=logging.INFO,
+    )
     main()
     create_index()
+    create_lod_table()
+    create_area_tables()
+    bump_data_version()
+
+    # Refresh the Parquet store read by the DuckDB backend
+    if DATA_BACKEND == "duckdb":
+        export_store()
+
+    # Rewrite the value cube, if one is in use, for the new data version
+    if CUBE_PATH.exists():
+        export_value_cube()
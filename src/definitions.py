@@ -10,9 +10,139 @@ IMG_PATH = ROOT_DIR / "images"
 SQL_PATH = ROOT_DIR / "sql"
 ASSETS_PATH = ROOT_DIR / "assets"
 
+# VARIABLES
+variables = {
+    "Total precipitation (mm)": "tp",
+    "Mean temperature 2m (K)": "t2m",
+    "Minimum temperature 2m (K)": "t2m_min",
+    "Maximum temperature 2m (K)": "t2m_max",
+    "Maximum nocturnal temperature (K)": "max_nocturnal_temp",
+    "Minimum diurnal temperature (K)": "min_diurnal_temp",
+    "Diurnal temperature variation (K)": "diurnal_temp_variation",
+    "NDVI": "ndvi",
+}
+
+# Aggregation levels of the map. Provinces and regions are dissolved from the
+# towns and their values are area-weighted means of their towns
+aggregation_levels = {
+    "Town": "town",
+    "Province": "province",
+    "Region": "region",
+}
+area_levels = ["province", "region"]
+
+# Temporal resolutions of the map. Months, seasons and years are rolled up
+# during ingestion: precipitation is summed and the other variables averaged
+temporal_resolutions = {
+    "Day": "day",
+    "Month": "month",
+    "Season": "season",
+    "Year": "year",
+}
+
+# Colour-scale modes: the default range of each variable, the 2nd to 98th
+# percentiles of the selected date or the typical range of the whole record
+colour_scale_modes = {
+    "Fixed": "fixed",
+    "Selected date": "date",
+    "Climatology": "climatology",
+}
+
+# Variables stored by each measurements table
+source_variables = {
+    "era5": [
+        "t2m",
+        "tp",
+        "t2m_min",
+        "t2m_max",
+        "max_nocturnal_temp",
+        "min_diurnal_temp",
+        "diurnal_temp_variation",
+    ],
+    "modis": ["ndvi"],
+}
+variable_sources = {
+    variable: source
+    for source, source_vars in source_variables.items()
+    for variable in source_vars
+}
+
 # DATABASE PARAMS
 DB_USER = os.getenv("POSTGRES_USER")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
+
+# Connection pool of each dashboard process. Connections are checked before
+# use and recycled before the server or a proxy drops them as idle
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# STORAGE BACKEND
+# Where the dashboard reads its data: 'postgres' for the TimescaleDB/PostGIS
+# database, or 'duckdb' for a Parquet store exported from it and queried with
+# an embedded DuckDB, which needs no database server. Vector tiles and
+# measurement exports are only served with 'postgres'
+DATA_BACKEND = os.getenv("DATA_BACKEND", "postgres")
+PARQUET_PATH = Path(os.getenv("PARQUET_PATH", DATA_PATH / "parquet"))
+# Rows per Parquet row group. Measurements are sorted by date, so DuckDB skips
+# the row groups of other dates from their statistics
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", 65_536))
+
+# Dense town × date cube of the daily town values, written by value_cube.py.
+# When one exists for the current data version, the dashboard reads daily town
+# maps and town series from it instead of the backend
+CUBE_PATH = Path(os.getenv("CUBE_PATH", DATA_PATH / "cube"))
+
+# Town × pixel weights of each grid, computed once from the towns and reused
+# to aggregate every file on that grid
+WEIGHTS_PATH = Path(os.getenv("WEIGHTS_PATH", DATA_PATH / "weights"))
+
+# MODIS INGESTION PARAMS
+# Composites are read in bands of MODIS_TILE_ROWS rows of pixels, and as many
+# are inserted at once as fit in MODIS_MEMORY_LIMIT_MB
+MODIS_MEMORY_LIMIT_MB = int(os.getenv("MODIS_MEMORY_LIMIT_MB", 4096))
+MODIS_TILE_ROWS = int(os.getenv("MODIS_TILE_ROWS", 512))
+
+# BULK LOAD PARAMS
+# Rows encoded per block of the binary COPY stream, and whether rows go
+# through a staging table before the target table
+BULK_LOAD_CHUNK_ROWS = int(os.getenv("BULK_LOAD_CHUNK_ROWS", 100_000))
+BULK_LOAD_STAGING = os.getenv("BULK_LOAD_STAGING", "false").lower() == "true"
+
+# Measurement chunks older than this are compressed, segmented by town and
+# ordered by date. Newer chunks stay row-based while they may still get data
+COMPRESS_AFTER = os.getenv("COMPRESS_AFTER", "1 year")
+
+# CACHE PARAMS
+FIGURE_CACHE_MAX_BYTES = int(os.getenv("FIGURE_CACHE_MAX_BYTES", 256 * 1024**2))
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", 60))
+DATE_CACHE_MAX_BYTES = int(os.getenv("DATE_CACHE_MAX_BYTES", 128 * 1024**2))
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", 256 * 1024**2))
+SERIES_CACHE_MAX_BYTES = int(os.getenv("SERIES_CACHE_MAX_BYTES", 64 * 1024**2))
+
+# Disk cache shared by every worker process on the host
+SHARED_CACHE_PATH = Path(os.getenv("SHARED_CACHE_PATH", DATA_PATH / "cache"))
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", 2 * 1024**3))
+
+# PREFETCH PARAMS
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 2))
+PREFETCH_RADIUS = int(os.getenv("PREFETCH_RADIUS", 3))
+
+# ANIMATION PARAMS
+# Longest time-lapse, frames sent per chunk and time each frame is shown
+ANIMATION_MAX_DAYS = int(os.getenv("ANIMATION_MAX_DAYS", 366))
+ANIMATION_CHUNK_FRAMES = int(os.getenv("ANIMATION_CHUNK_FRAMES", 10))
+ANIMATION_FRAME_MS = int(os.getenv("ANIMATION_FRAME_MS", 400))
+ANIMATION_CACHE_MAX_BYTES = int(os.getenv("ANIMATION_CACHE_MAX_BYTES", 256 * 1024**2))
+
+# EXPORT PARAMS
+# Rows fetched from the server-side cursor and written per CSV chunk or
+# Parquet row group
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 100_000))
+
+# GEOMETRY LEVELS OF DETAIL
+# (minimum map zoom, simplification tolerance in degrees), by increasing zoom
+GEOMETRY_LODS = [(0, 0.01), (7, 0.002), (9, 0.0005), (11, 0.0001)]
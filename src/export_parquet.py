@@ -0,0 +1,158 @@
+import os
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine
+from tqdm import tqdm
+
+from definitions import (
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    GEOMETRY_LODS,
+    PARQUET_PATH,
+    PARQUET_ROW_GROUP_ROWS,
+    area_levels,
+    source_variables,
+)
+from utils import read_arrow, read_frame, read_sql_query
+
+# Columns of the tables copied whole into the store. Town and area geometries
+# are only stored at their levels of detail, in 'towns_lod' and 'areas_lod'
+copied_tables = {
+    "time": "time_id, date",
+    "towns": "town_id, town_name",
+    "towns_lod": "town_id, tolerance, geometry",
+    "areas": "area_id, level, area_name",
+    "area_towns": "area_id, town_id, weight",
+    "era5_area_measurements": "*",
+    "modis_area_measurements": "*",
+    "era5_period_measurements": "*",
+    "modis_period_measurements": "*",
+    "variable_stats": "*",
+    "variable_climatology": "*",
+    "period_climatology": "*",
+    "data_version": "version",
+}
+
+
+def write_table(table: pa.Table, directory: Path) -> None:
+    """
+    Write a table as the single file of a store directory
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    pq.write_table(
+        table, directory / "part-0.parquet", row_group_size=PARQUET_ROW_GROUP_ROWS
+    )
+
+
+def wkb_geometries(table: pa.Table) -> pa.Table:
+    """
+    Replace the hex EWKB strings of the 'geometry' column with WKB bytes
+    """
+    geometry = pa.array(
+        [bytes.fromhex(value) for value in table["geometry"].to_pylist()],
+        type=pa.binary(),
+    )
+    return table.set_column(
+        table.schema.get_field_index("geometry"), "geometry", geometry
+    )
+
+
+def measurement_schema(source: str) -> pa.Schema:
+    """
+    Return the schema of the measurement files of a source. It is fixed, so a
+    year where a variable is all null still has a float column
+    """
+    return pa.schema(
+        [("date", pa.date32()), ("town_id", pa.int64())]
+        + [(variable, pa.float64()) for variable in source_variables[source]]
+    )
+
+
+def export_store(path: Path = PARQUET_PATH, years: list[int] | None = None) -> None:
+    """
+    Connect to the database and write every table the dashboard reads to a
+    Parquet store for the DuckDB backend. Measurements go in one file per year,
+    sorted by date. With years, only the measurements of those years are read
+    again, and the files of the other years are linked from the current store.
+    The store is written next to the current one and swapped in at the end
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    staging = path.with_name(f"{path.name}.new")
+    shutil.rmtree(staging, ignore_errors=True)
+
+    for name, columns in copied_tables.items():
+        table = read_arrow(connection, f"SELECT {columns} FROM {name}")
+        if "geometry" in table.column_names:
+            table = wkb_geometries(table)
+        write_table(table, staging / name)
+
+    # Dissolved areas are simplified on the fly by PostGIS, so store each
+    # level of detail as towns_lod does
+    select_area_geometries = read_sql_query("select_area_geometries.sql")
+    areas_lod = []
+    for level in area_levels:
+        for _, tolerance in GEOMETRY_LODS:
+            table = read_arrow(
+                connection,
+                select_area_geometries,
+                {"level": level, "tolerance": tolerance},
+            )
+            table = table.append_column("level", pa.repeat(level, len(table)))
+            table = table.append_column("tolerance", pa.repeat(tolerance, len(table)))
+            areas_lod.append(wkb_geometries(table))
+    write_table(pa.concat_tables(areas_lod), staging / "areas_lod")
+
+    all_years = read_frame(connection, read_sql_query("select_years.sql"))["year"]
+    for source in source_variables:
+        select_range = read_sql_query(f"select_{source}_range.sql")
+        schema = measurement_schema(source)
+        directory = f"{source}_measurements"
+        for year in tqdm(all_years, desc=f"Exporting {source} measurements"):
+            current = path / directory / f"year={year}"
+            if years is not None and year not in years and current.exists():
+                # Hard links, so untouched years are neither read nor copied
+                shutil.copytree(
+                    current, staging / directory / f"year={year}", copy_function=os.link
+                )
+                continue
+
+            table = read_arrow(
+                connection,
+                select_range,
+                {"start_date": f"{year}-01-01", "end_date": f"{year}-12-31"},
+            )
+            if len(table) == 0:
+                continue
+            table = table.select(schema.names).cast(schema)
+            write_table(table, staging / directory / f"year={year}")
+
+        # DuckDB cannot create a view over a directory without files, so a
+        # source without any rows still gets an empty one
+        if not (staging / directory).exists():
+            write_table(schema.empty_table(), staging / directory)
+
+    connection.close()
+
+    # Swap the new store in. Dashboard queries only fail in the moment between
+    # both renames
+    previous = path.with_name(f"{path.name}.old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if path.exists():
+        path.rename(previous)
+    staging.rename(path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    export_store()
@@ -0,0 +1,21 @@
+import multiprocessing
+import os
+
+# Each worker is a separate process with its own engine and in-memory caches.
+# Geometries and per-date values are shared between workers through the disk
+# cache in SHARED_CACHE_PATH, so a date read by one worker is not read again
+# by the others
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8050")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+
+# Threads let a worker keep answering while a callback waits on the database.
+# Keep workers * threads within what DB_POOL_SIZE + DB_MAX_OVERFLOW allow
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# Do not preload: the app starts a warm-up thread and opens connections lazily,
+# and neither survives a fork
+preload_app = False
+
+accesslog = "-"
@@ -0,0 +1,77 @@
+import hashlib
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from definitions import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from utils import read_frame, read_sql_query
+
+# Bytes read per step when hashing a source file
+CHECKSUM_BLOCK_BYTES = 8 * 1024**2
+
+
+def file_checksum(path: str | Path) -> str:
+    """
+    Return the SHA-256 hex digest of a file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(CHECKSUM_BLOCK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(source: str) -> dict[str, str]:
+    """
+    Connect to the database and return the checksum of every file of a source
+    already loaded, by file name
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    with engine.connect() as connection:
+        manifest = read_frame(
+            connection,
+            read_sql_query("select_ingestion_manifest.sql"),
+            {"source": source},
+            index_col="file_name",
+        )
+    return manifest["checksum"].to_dict()
+
+
+def record_loaded_file(loaded_file: dict) -> None:
+    """
+    Connect to the database and record a loaded file in the manifest, with its
+    source, file_name, checksum, row_count, start_date and end_date
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+    upsert_ingestion_manifest = read_sql_query("upsert_ingestion_manifest.sql")
+    connection.execute(text(upsert_ingestion_manifest), loaded_file)
+    connection.commit()
+    connection.close()
+
+
+def read_unpublished_years() -> list[int]:
+    """
+    Connect to the database and return the years covered by the files of any
+    source loaded since the last data version. A run that crashed before
+    publishing its files leaves them here, so the next run publishes them
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+    create_data_version_table = read_sql_query("create_data_version_table.sql")
+    connection.execute(text(create_data_version_table))
+    connection.commit()
+
+    select_unpublished_years = read_sql_query("select_unpublished_years.sql")
+    years = read_frame(connection, select_unpublished_years)["year"].tolist()
+    connection.close()
+    return years
@@ -0,0 +1,70 @@
+from sqlalchemy import create_engine, text
+from tqdm import tqdm
+
+from definitions import (
+    COMPRESS_AFTER,
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    source_variables,
+)
+from utils import read_frame, read_sql_query
+
+
+def migrate(source: str) -> None:
+    """
+    Connect to the database and rebuild the measurements hypertable of a source
+    partitioned on a date column. Rows are copied a year at a time, so each
+    batch only reads the chunks of the old table holding that year
+    """
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    # Set the old table aside and create the new one in its place
+    for query in [
+        f"rename_{source}_measurements_table.sql",
+        f"create_{source}_measurements_table.sql",
+        f"create_{source}_measurements_hypertable.sql",
+        f"enable_{source}_measurements_compression.sql",
+    ]:
+        connection.execute(text(read_sql_query(query)))
+    connection.commit()
+
+    years = read_frame(connection, read_sql_query("select_years.sql"))
+    copy_measurements = read_sql_query(f"copy_{source}_measurements_by_date.sql")
+    for year in tqdm(years.itertuples(), total=len(years), desc=f"Migrating {source}"):
+        connection.execute(
+            text(copy_measurements),
+            {"start_time_id": year.start_time_id, "end_time_id": year.end_time_id},
+        )
+        connection.commit()
+
+    drop_old_table = read_sql_query(f"drop_{source}_measurements_by_time_id.sql")
+    connection.execute(text(drop_old_table))
+    connection.commit()
+
+    # Rebuild the indexes on the new table
+    for query in [
+        f"create_town_time_index_{source}.sql",
+        f"create_date_town_index_{source}.sql",
+    ]:
+        connection.execute(text(read_sql_query(query)))
+    connection.commit()
+
+    # Compress the historical chunks once they are all in place
+    compress_chunks = read_sql_query(f"compress_{source}_measurements.sql")
+    connection.execute(text(compress_chunks), {"compress_after": COMPRESS_AFTER})
+    connection.commit()
+    connection.close()
+
+
+if __name__ == "__main__":
+    # One-off migration of databases ingested before the measurements were
+    # partitioned on their date. Run it once, with the dashboard stopped
+    for source in source_variables:
+        migrate(source)
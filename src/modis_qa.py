@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from functools import cache
+
+import numpy as np
+
+# Every value of the 16-bit VI Quality word
+QA_VALUES = np.arange(2**16, dtype=np.uint16)
+
+
+@dataclass(frozen=True)
+class MaskPolicy:
+    """
+    Which VI Quality flags mask a MODIS pixel. The defaults are the ones of
+    the dashboard. See: https://lpdaac.usgs.gov/documents/103/MOD13_User_Guide_V6.pdf
+    table 5, page 16.
+    """
+
+    # VI quality codes to mask: cloudy and not produced
+    vi_quality: tuple[int, ...] = (0b10, 0b11)
+    # Lowest VI usefulness code to mask: low quality or not useful
+    usefulness_threshold: int = 0b1100
+    # Aerosol quantity codes to mask: high
+    aerosol_quantity: tuple[int, ...] = (0b11,)
+    adjacent_cloud: bool = True
+    mixed_clouds: bool = True
+    snow_ice: bool = True
+    shadow: bool = True
+
+
+DEFAULT_POLICY = MaskPolicy()
+
+
+def decode_qa(qa_bits: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Split VI Quality words into the fields the mask policy looks at
+    """
+    qa_bits = np.asarray(qa_bits, dtype=np.uint16)
+    return {
+        "vi_quality": qa_bits & 0b11,  # Bits 0-1
+        "vi_usefulness": (qa_bits >> 2) & 0b1111,  # Bits 2-5
+        "aerosol_quantity": (qa_bits >> 6) & 0b11,  # Bits 6-7
+        "adjacent_cloud": (qa_bits >> 8) & 0b1,  # Bit 8
+        "mixed_clouds": (qa_bits >> 10) & 0b1,  # Bit 10
+        "snow_ice": (qa_bits >> 14) & 0b1,  # Bit 14
+        "shadow": (qa_bits >> 15) & 0b1,  # Bit 15
+    }
+
+
+@cache
+def mask_table(policy: MaskPolicy = DEFAULT_POLICY) -> np.ndarray:
+    """
+    Return whether each of the 65,536 VI Quality words is masked by a policy,
+    indexed by the word
+    """
+    fields = decode_qa(QA_VALUES)
+    masked = np.isin(fields["vi_quality"], policy.vi_quality)
+    masked |= fields["vi_usefulness"] >= policy.usefulness_threshold
+    masked |= np.isin(fields["aerosol_quantity"], policy.aerosol_quantity)
+    for flag in ["adjacent_cloud", "mixed_clouds", "snow_ice", "shadow"]:
+        if getattr(policy, flag):
+            masked |= fields[flag] == 1
+
+    masked.flags.writeable = False
+    return masked
+
+
+def mask_bad_pixels(
+    qa_bits: np.ndarray, policy: MaskPolicy = DEFAULT_POLICY
+) -> np.ndarray:
+    """
+    Given the MODIS VI QA values, return False where the pixel is ok and True
+    where it should be masked, with one lookup per pixel. Values without a QA
+    word, NaN once decoded by xarray, are masked
+    """
+    qa_bits = np.asarray(qa_bits)
+    if np.issubdtype(qa_bits.dtype, np.floating):
+        missing = np.isnan(qa_bits)
+        return (
+            missing
+            | mask_table(policy)[np.where(missing, 0, qa_bits).astype(np.uint16)]
+        )
+    return mask_table(policy)[qa_bits.astype(np.uint16)]
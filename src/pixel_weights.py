@@ -0,0 +1,193 @@
+import logging
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from tqdm import tqdm
+
+from definitions import DATA_PATH, WEIGHTS_PATH
+
+logger = logging.getLogger(__name__)
+
+# Weights loaded by this process, by grid name
+pixel_weights = {}
+
+
+class PixelWeights:
+    """
+    Sparse town × pixel matrix of a regular lat/lon grid. Each entry is the
+    area of a town covered by a pixel, so a town value is the mean of its
+    pixels weighted by their exact overlap with it. Pixels are numbered in
+    (lat, lon) order, as the values of a grid flattened in C order, so a band
+    of grid rows is a contiguous range of columns
+    """
+
+    def __init__(
+        self, towns: pd.Index, lon: np.ndarray, lat: np.ndarray, matrix
+    ) -> None:
+        self.towns = towns
+        self.lon = lon
+        self.lat = lat
+        # Column-major, so the columns of a band are sliced without a copy of
+        # the whole matrix
+        self.matrix = sparse.csc_array(matrix)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes
+
+    def matches(self, lon: np.ndarray, lat: np.ndarray) -> bool:
+        """
+        Return whether the weights were computed for a grid
+        """
+        return np.array_equal(self.lon, lon) and np.array_equal(self.lat, lat)
+
+    def partial_sums(
+        self, values: np.ndarray, start_row: int = 0
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the weighted sum of the values of each town and the weight of
+        the pixels with a value, for values on a band of grid rows from
+        start_row, shaped (..., rows, lon). Sums of the bands of a grid add up
+        to the sums of the whole grid. Both are shaped (town, ...)
+        """
+        leading = values.shape[:-2]
+        rows = values.shape[-2]
+        values = values.reshape(-1, rows * len(self.lon)).T
+        valid = ~np.isnan(values)
+
+        columns = slice(start_row * len(self.lon), (start_row + rows) * len(self.lon))
+        band = self.matrix[:, columns]
+        totals = band @ np.where(valid, values, 0)
+        weights = band @ valid.astype(float)
+        shape = (len(self.towns), *leading)
+        return totals.reshape(shape), weights.reshape(shape)
+
+    @staticmethod
+    def means(totals: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        Return the weighted means of partial sums, NaN for towns without any
+        value
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weights > 0, totals / weights, np.nan)
+
+    def aggregate(self, values: np.ndarray) -> np.ndarray:
+        """
+        Reduce values on the grid, shaped (..., lat, lon), to the weighted mean
+        of each town, shaped (..., town). NaN pixels are left out of the mean
+        and towns without any value are NaN
+        """
+        return np.moveaxis(self.means(*self.partial_sums(values)), 0, -1)
+
+    def save(self, path: Path) -> None:
+        """
+        Write the weights to an .npz file, replacing any previous one at once
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f"{path.stem}.new.npz")
+        np.savez(
+            staging,
+            towns=self.towns.to_numpy(dtype=str),
+            lon=self.lon,
+            lat=self.lat,
+            format=self.matrix.format,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=self.matrix.shape,
+        )
+        staging.rename(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "PixelWeights":
+        with np.load(path) as arrays:
+            sparse_array = {"csr": sparse.csr_array, "csc": sparse.csc_array}
+            matrix = sparse_array[str(arrays["format"])](
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(arrays["shape"]),
+            )
+            towns = pd.Index(arrays["towns"], name="town_name")
+            return cls(towns, arrays["lon"], arrays["lat"], matrix)
+
+
+def compute_pixel_weights(
+    towns: gpd.GeoDataFrame, lon: np.ndarray, lat: np.ndarray, half_size: float
+) -> PixelWeights:
+    """
+    Compute the weights of a grid of square pixels of half_size degrees around
+    the lon/lat centres. Each town is matched with the window of pixels around
+    its bounds: pixels it contains weigh their whole area, the ones on its
+    border the area of their intersection with it. Areas are in square degrees
+    scaled by the cosine of the latitude, which is proportional to their area
+    on the ground
+    """
+    rows, columns, weights = [], [], []
+    for row, geometry in enumerate(
+        tqdm(towns.geometry, desc="Computing pixel weights")
+    ):
+        xmin, ymin, xmax, ymax = geometry.bounds
+        lon_window = np.flatnonzero((lon + half_size > xmin) & (lon - half_size < xmax))
+        lat_window = np.flatnonzero((lat + half_size > ymin) & (lat - half_size < ymax))
+        if len(lon_window) == 0 or len(lat_window) == 0:
+            continue
+
+        lat_index, lon_index = np.meshgrid(lat_window, lon_window, indexing="ij")
+        lat_index, lon_index = lat_index.ravel(), lon_index.ravel()
+        pixels = shapely.box(
+            lon[lon_index] - half_size,
+            lat[lat_index] - half_size,
+            lon[lon_index] + half_size,
+            lat[lat_index] + half_size,
+        )
+
+        shapely.prepare(geometry)
+        areas = np.where(shapely.contains(geometry, pixels), shapely.area(pixels), 0)
+        border = (areas == 0) & shapely.intersects(geometry, pixels)
+        areas[border] = shapely.area(shapely.intersection(geometry, pixels[border]))
+        areas *= np.cos(np.radians(lat[lat_index]))
+
+        overlap = areas > 0
+        rows.append(np.full(overlap.sum(), row))
+        columns.append(lat_index[overlap] * len(lon) + lon_index[overlap])
+        weights.append(areas[overlap])
+
+    matrix = sparse.coo_array(
+        (np.concatenate(weights), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(len(towns), len(lat) * len(lon)),
+    )
+    return PixelWeights(
+        pd.Index(towns["town_name"], name="town_name"), lon, lat, matrix
+    )
+
+
+def load_pixel_weights(
+    grid: str, lon: np.ndarray, lat: np.ndarray, half_size: float
+) -> PixelWeights:
+    """
+    Return the weights of a grid from this process, from its file under
+    WEIGHTS_PATH or, when neither is for these coordinates, computed from the
+    towns and written to that file
+    """
+    weights = pixel_weights.get(grid)
+    # Files written before the matrix format was stored are named without
+    # _v2, so they are never read and the weights are computed again
+    path = WEIGHTS_PATH / f"{grid}_v2.npz"
+    if (weights is None or not weights.matches(lon, lat)) and path.exists():
+        weights = PixelWeights.load(path)
+
+    if weights is None or not weights.matches(lon, lat):
+        logger.info(f"Computing the town weights of the {grid} grid")
+        towns = gpd.read_parquet(DATA_PATH / "shapefiles" / "towns_v2.parquet")
+        towns = towns.to_crs(epsg=4326)
+        # Measurements are keyed by town name, so towns sharing one are a
+        # single area, as when their pixels were grouped by name
+        towns = towns.dissolve(by="town_name").reset_index()
+        weights = compute_pixel_weights(towns, lon, lat, half_size)
+        weights.save(path)
+
+    pixel_weights[grid] = weights
+    return weights
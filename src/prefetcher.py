@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import RLock
+
+# Sessions whose wanted keys are remembered. The ones that stopped browsing
+# the longest ago are forgotten first
+MAX_SESSIONS = 256
+
+
+class Prefetcher:
+    """
+    Speculatively run loads on a bounded pool of threads, shared by every
+    session of the process. Each call to prefetch states the whole set of keys
+    a session still wants: pending loads that no session wants any more are
+    cancelled, so when a user jumps elsewhere the pool moves on to the new
+    neighbourhood without dropping what other users are waiting for. Loads
+    that already started are left to finish.
+    """
+
+    def __init__(self, load: Callable[[Hashable], object], max_workers: int) -> None:
+        self._load = load
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="prefetch"
+        )
+        self._pending: dict[Hashable, Future] = {}
+        self._wanted: OrderedDict[Hashable, set] = OrderedDict()
+        # Reentrant, since a future that is already done runs its callback
+        # from add_done_callback, and cancel runs it too
+        self._lock = RLock()
+
+    def prefetch(self, session: Hashable, keys: list[Hashable]) -> None:
+        """
+        Schedule a load for every key a session wants, most urgent first, and
+        cancel the pending loads of keys no session wants
+        """
+        with self._lock:
+            self._wanted[session] = set(keys)
+            self._wanted.move_to_end(session)
+            while len(self._wanted) > MAX_SESSIONS:
+                self._wanted.popitem(last=False)
+
+            wanted = set().union(*self._wanted.values())
+            for key, future in list(self._pending.items()):
+                if key not in wanted:
+                    future.cancel()
+
+            for key in keys:
+                if key not in self._pending:
+                    future = self._executor.submit(self._load, key)
+                    self._pending[key] = future
+                    future.add_done_callback(
+                        lambda done, key=key: self._forget(key, done)
+                    )
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        # Finished and cancelled loads leave the pending set, so a key whose
+        # entry was evicted since is loaded again when it is wanted
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
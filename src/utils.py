@@ -1,4 +1,4 @@
-from definitions import SQL_PATH
+from definitions import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER, SQL_PATH
 
 
 def read_sql_query(sql_file: str) -> str:
@@ -6,3 +6,82 @@ def read_sql_query(sql_file: str) -> str:
     Read an SQL file and return the query as a string
     """
     return (SQL_PATH / sql_file).read_text()
+
+
+def bump_data_version() -> None:
+    """
+    Record a new ingestion run. The dashboard compares this version stamp
+    against the one its caches were filled with and drops stale entries
+    """
+    # Imported here so the dashboard can read SQL files without SQLAlchemy
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    create_data_version_table = read_sql_query("create_data_version_table.sql")
+    connection.execute(text(create_data_version_table))
+
+    insert_to_data_version = read_sql_query("insert_to_data_version.sql")
+    connection.execute(text(insert_to_data_version))
+    connection.commit()
+    connection.close()
+
+
+def refresh_climatology() -> None:
+    """
+    Recompute the typical range of every variable from the per-date statistics
+    filled during ingestion. The dashboard uses it as an adaptive colour scale
+    """
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(
+        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+    connection = engine.connect()
+
+    refresh_variable_climatology = read_sql_query("refresh_variable_climatology.sql")
+    connection.execute(text(refresh_variable_climatology))
+    connection.commit()
+    connection.close()
+
+
+def read_arrow(connection, query: str, params: dict | None = None):
+    """
+    Run a query through COPY ... TO STDOUT and parse the CSV stream with
+    pyarrow, so results land in columnar buffers instead of one Python object
+    per row and column. connection is a SQLAlchemy connection, and query may
+    use the same :name parameters as the other SQL files. They are bound on the
+    client, since COPY does not accept server-side parameters
+    """
+    import io
+
+    import pyarrow.csv as pa_csv
+    from sqlalchemy import text
+
+    query = str(text(query.strip().rstrip(";")).compile(dialect=connection.dialect))
+    buffer = io.BytesIO()
+    with connection.connection.cursor() as cursor:
+        query = cursor.mogrify(query, params or {}).decode()
+        cursor.copy_expert(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer
+        )
+    buffer.seek(0)
+    return pa_csv.read_csv(buffer)
+
+
+def read_frame(
+    connection, query: str, params: dict | None = None, index_col: str | None = None
+):
+    """
+    Read a query into a DataFrame through read_arrow. Dates come back as
+    datetime64 columns
+    """
+    df = read_arrow(connection, query, params).to_pandas(date_as_object=False)
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
@@ -0,0 +1,179 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from definitions import CUBE_PATH, source_variables
+
+# Towns written per step when transposing a cube into its town-major copy
+TRANSPOSE_TOWNS = 256
+
+
+class ValueCube:
+    """
+    Daily town values of every variable, memory-mapped from the .npy files
+    written by export_value_cube. Each source is stored twice: date-major, so
+    the values of every town for a date are one contiguous block, and
+    town-major, so the series of a town is one contiguous block. Missing
+    values are NaN
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        metadata = json.loads((path / "metadata.json").read_text())
+        self.version = metadata["version"]
+        self.towns = pd.Index(np.load(path / "town_ids.npy"), name="town_id")
+        self._sources = {}
+        for source, variables in metadata["variables"].items():
+            self._sources[source] = (
+                variables,
+                pd.DatetimeIndex(np.load(path / f"{source}_dates.npy"), name="date"),
+                np.load(path / f"{source}_by_date.npy", mmap_mode="r"),
+                np.load(path / f"{source}_by_town.npy", mmap_mode="r"),
+            )
+
+    def date_values(self, source: str, date) -> pd.DataFrame | None:
+        """
+        Return every variable of a source for a date, indexed by town_id, or
+        None when the cube has no such date
+        """
+        variables, dates, by_date, _ = self._sources[source]
+        try:
+            row = dates.get_loc(pd.Timestamp(date))
+        except KeyError:
+            return None
+        values = np.asarray(by_date[row], dtype=float)
+        return pd.DataFrame(values, index=self.towns, columns=variables)
+
+    def town_series(self, town_id) -> pd.DataFrame | None:
+        """
+        Return the series of every variable for a town, indexed by date, or
+        None when the cube has no such town. Dates where a source has no value
+        are left out of it, as in the database
+        """
+        try:
+            column = self.towns.get_loc(town_id)
+        except KeyError:
+            return None
+
+        series = []
+        for variables, dates, _, by_town in self._sources.values():
+            df = pd.DataFrame(
+                np.asarray(by_town[column], dtype=float), index=dates, columns=variables
+            )
+            series.append(df.dropna(how="all"))
+        return pd.concat(series, axis=1)
+
+
+def open_value_cube(path: Path, version) -> ValueCube | None:
+    """
+    Open the cube at path if it was exported for a data version, else None
+    """
+    try:
+        cube = ValueCube(path)
+    except FileNotFoundError:
+        return None
+    return cube if cube.version == version else None
+
+
+def export_value_cube(path: Path = CUBE_PATH, years: list[int] | None = None) -> None:
+    """
+    Write the daily town values of every source as a float32 cube from the
+    dashboard backend, a year at a time. With years, only those years are read
+    from the backend, and the other ones are copied from the current cube when
+    it has all their dates for the same towns and variables. The cube is
+    written next to the current one and swapped in at the end
+    """
+    from tqdm import tqdm
+
+    from app_data_fetcher import get_backend, get_data_version
+
+    backend = get_backend()
+    staging = path.with_name(f"{path.name}.new")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    towns = pd.Index(
+        np.sort(backend.read_frame("select_towns.sql")["town_id"].to_numpy()),
+        name="town_id",
+    )
+    np.save(staging / "town_ids.npy", towns.to_numpy())
+
+    current = None
+    if years is not None:
+        try:
+            current = ValueCube(path)
+        except FileNotFoundError:
+            pass
+    if current is not None and not current.towns.equals(towns):
+        current = None
+
+    for source, variables in source_variables.items():
+        # Every date with values, from the statistics filled during ingestion
+        dates = pd.DatetimeIndex(
+            backend.read_frame(
+                "select_variable_dates.sql", params={"variable": variables[0]}
+            )["date"]
+        )
+        np.save(staging / f"{source}_dates.npy", dates.to_numpy())
+
+        shape = (len(dates), len(towns), len(variables))
+        by_date = np.lib.format.open_memmap(
+            staging / f"{source}_by_date.npy", mode="w+", dtype=np.float32, shape=shape
+        )
+        by_date[:] = np.nan
+
+        export_years = set(dates.year)
+        if current is not None and current._sources[source][0] == variables:
+            _, current_dates, current_by_date, _ = current._sources[source]
+            current_rows = current_dates.get_indexer(dates)
+            # Years with a date the current cube lacks are read again too
+            export_years = set(years) & set(dates.year)
+            export_years |= set(dates[current_rows < 0].year)
+            for year in sorted(set(dates.year) - export_years):
+                rows = np.flatnonzero(dates.year == year)
+                by_date[rows] = current_by_date[current_rows[rows]]
+
+        for year in tqdm(sorted(export_years), desc=f"Exporting {source} cube"):
+            df = backend.read_frame(
+                f"select_{source}_range.sql",
+                params={"start_date": f"{year}-01-01", "end_date": f"{year}-12-31"},
+            )
+            rows = dates.get_indexer(pd.to_datetime(df["date"]))
+            columns = towns.get_indexer(df["town_id"])
+            found = (rows >= 0) & (columns >= 0)
+            by_date[rows[found], columns[found]] = df[variables].to_numpy()[found]
+        by_date.flush()
+
+        # Town-major copy, a block of towns at a time so both files are read
+        # and written in long runs
+        by_town = np.lib.format.open_memmap(
+            staging / f"{source}_by_town.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(shape[1], shape[0], shape[2]),
+        )
+        for start in range(0, len(towns), TRANSPOSE_TOWNS):
+            stop = start + TRANSPOSE_TOWNS
+            by_town[start:stop] = by_date[:, start:stop].transpose(1, 0, 2)
+        by_town.flush()
+        del by_date, by_town
+
+    del current
+
+    # Written last: a cube without its metadata is never opened
+    metadata = {"version": get_data_version(), "variables": source_variables}
+    (staging / "metadata.json").write_text(json.dumps(metadata))
+
+    previous = path.with_name(f"{path.name}.old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if path.exists():
+        path.rename(previous)
+    staging.rename(path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    export_value_cube()
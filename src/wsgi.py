@@ -0,0 +1,5 @@
+from app import create_app
+
+# Production entry point, run from this directory with
+#   gunicorn --config gunicorn.conf.py wsgi:server
+server = create_app().server
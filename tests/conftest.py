@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are run from src, as scripts and by the dashboard
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmark_modis_qa import reference_mask
+from modis_qa import QA_VALUES, MaskPolicy, mask_bad_pixels
+
+# Bits 8, 10, 14 and 15: adjacent cloud, mixed clouds, snow/ice and shadow
+FLAG_BITS = (1 << 8) | (1 << 10) | (1 << 14) | (1 << 15)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return np.array([reference_mask(int(value)) for value in QA_VALUES])
+
+
+def test_every_word_matches_reference(reference):
+    np.testing.assert_array_equal(mask_bad_pixels(QA_VALUES), reference)
+
+
+def test_float_words_and_missing_values(reference):
+    qa = np.array([np.nan, 0, 2, 0b1100 << 2, 1 << 15, 2**16 - 1, np.nan])
+    expected = [True] + [reference[int(value)] for value in qa[1:-1]] + [True]
+    np.testing.assert_array_equal(mask_bad_pixels(qa), expected)
+
+
+def test_float_grid_keeps_its_shape(reference):
+    qa = QA_VALUES[:12].astype(float).reshape(3, 4)
+    qa[1, 2] = np.nan
+    expected = reference[:12].reshape(3, 4).copy()
+    expected[1, 2] = True
+    np.testing.assert_array_equal(mask_bad_pixels(qa), expected)
+
+
+def test_signed_words(reference):
+    # Bit 15 set reads as a negative int16, with the same flags
+    qa = QA_VALUES.view(np.int16)
+    assert qa.min() < 0
+    np.testing.assert_array_equal(mask_bad_pixels(qa), reference)
+
+
+def test_flags_turned_off(reference):
+    policy = MaskPolicy(
+        adjacent_cloud=False, mixed_clouds=False, snow_ice=False, shadow=False
+    )
+    expected = reference[QA_VALUES & ~np.uint16(FLAG_BITS)]
+    np.testing.assert_array_equal(mask_bad_pixels(QA_VALUES, policy), expected)
+
+
+def test_usefulness_threshold():
+    policy = MaskPolicy(usefulness_threshold=0b1000)
+    usefulness = (QA_VALUES >> 2) & 0b1111
+    clear = (QA_VALUES & ~np.uint16(0b111100)) == 0
+    masked = mask_bad_pixels(QA_VALUES, policy)
+    # Words whose only field is usefulness are masked from the threshold on
+    np.testing.assert_array_equal(masked[clear], usefulness[clear] >= 0b1000)
+    assert not mask_bad_pixels(np.array([0b0111 << 2]), policy)[0]
+    assert mask_bad_pixels(np.array([0b1000 << 2]), policy)[0]
+    assert not mask_bad_pixels(np.array([0b1000 << 2]))[0]